@@ -1,15 +1,19 @@
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.views import LoginView
-from django.contrib.admin import AdminSite, ModelAdmin
+from django.contrib.admin import AdminSite, ModelAdmin, RelatedOnlyFieldListFilter
+from django.contrib.admin.utils import build_q_object_from_lookup_parameters
 from django.urls import path
-from django.http import HttpResponse
-from django.utils.encoding import smart_str
-from .models import CustomUser, Stall, MenuItem, Voucher, Order, CartItem, OrderItem
+from django.http import FileResponse, StreamingHttpResponse
+from django.db import transaction
+from django.utils import timezone
+from .models import CustomUser, Stall, MenuItem, Voucher, Order, CartItem, OrderItem, WebhookEvent, Notification, ArchivedOrder
 from .forms import SignUpForm
-from openpyxl import Workbook
-from openpyxl.utils import get_column_letter
+from .scheduling import adjust_queue
+from .receipts import receipt_archive
+from .exports import order_csv_rows, stream_csv, write_orders_by_day_xlsx
+from .parquet import write_dataset_zip
 import datetime
-import csv
+import tempfile
 
 class JSECAdminSite(AdminSite):
     site_header = "JSEC Express Admin"
@@ -103,83 +107,144 @@ class CartItemAdmin(BaseStallScopedAdmin):
     list_display = ["user", "item", "quantity"]
 
 class OrderItemAdmin(BaseStallScopedAdmin):
-    list_display = ["order", "item", "quantity"]
-
-class OrderAdmin(BaseStallScopedAdmin):
-    list_display = ["user", "stall", "pickup_time", "total_cost", "transaction_id", "is_complete"]
-    actions = ["export_orders_as_csv", "export_orders_by_day_excel"]
-
-    def export_orders_as_csv(self, request, queryset):
+    list_display = ["order", "item_name", "unit_price", "quantity", "line_total"]
+    list_select_related = ["order__user"]
+
+    # The Parquet export finds changed orders by updated_at, so editing or
+    # removing a line has to touch its order.
+    def touch_orders(self, order_ids):
+        Order.objects.filter(pk__in=order_ids).update(updated_at=timezone.now())
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.touch_orders([obj.order_id])
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.touch_orders([obj.order_id])
+
+    def delete_queryset(self, request, queryset):
+        order_ids = list(queryset.values_list('order_id', flat=True).distinct())
+        super().delete_queryset(request, queryset)
+        self.touch_orders(order_ids)
+
+class OrderExportMixin:
+    def export_querysets(self, request, queryset):
+        querysets = [queryset]
+        if self.model is Order and request.POST.get("select_across") == "1":
+            # "Select all" covers every order, including those already archived.
+            querysets.append(self.archived_changelist_queryset(request))
         if not request.user.is_superuser:
-            queryset = queryset.filter(stall__owner=request.user)
-
-        response = HttpResponse(content_type='text/csv')
+            querysets = [queryset.filter(stall__owner=request.user) for queryset in querysets]
+        return querysets
+
+    def archived_changelist_queryset(self, request):
+        # ArchivedOrder mirrors Order's fields, so the changelist's (already
+        # validated) filter lookups and search apply to it unchanged.
+        changelist = self.get_changelist_instance(request)
+        queryset = ArchivedOrder.objects.filter(build_q_object_from_lookup_parameters(changelist.get_filters_params()))
+        queryset, _ = self.get_search_results(request, queryset, changelist.query)
+        return queryset
+
+    def stream_orders_csv(self, request, queryset, include_items):
+        rows = order_csv_rows(self.export_querysets(request, queryset), include_items)
+        response = StreamingHttpResponse(stream_csv(rows), content_type='text/csv')
         response['Content-Disposition'] = 'attachment; filename=orders_export.csv'
-
-        writer = csv.writer(response)
-        writer.writerow([
-            "Order ID", "User", "Stall", "Pickup Time", 
-            "Total Cost", "Transaction ID", "Is Complete"
-        ])
-
-        for order in queryset:
-            writer.writerow([
-                order.id,
-                smart_str(order.user),
-                smart_str(order.stall),
-                order.pickup_time,
-                order.total_cost,
-                order.transaction_id,
-                order.is_complete
-            ])
-
         return response
 
+    def export_orders_as_csv(self, request, queryset):
+        return self.stream_orders_csv(request, queryset, include_items=False)
+
     export_orders_as_csv.short_description = "Export selected orders to CSV"
 
+    def export_orders_with_items_as_csv(self, request, queryset):
+        return self.stream_orders_csv(request, queryset, include_items=True)
+
+    export_orders_with_items_as_csv.short_description = "Export selected orders with items to CSV"
+
     def export_orders_by_day_excel(self, request, queryset):
+        excel_file = tempfile.TemporaryFile()
+        write_orders_by_day_xlsx(self.export_querysets(request, queryset), excel_file)
+        excel_file.seek(0)
+        filename = f"orders_by_day_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        return FileResponse(
+            excel_file,
+            as_attachment=True,
+            filename=filename,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        )
+
+    export_orders_by_day_excel.short_description = "Export orders grouped by day (Excel)"
+
+class OrderAdmin(OrderExportMixin, BaseStallScopedAdmin):
+    list_display = ["user", "stall", "pickup_time", "total_cost", "transaction_id", "is_complete"]
+    list_filter = [("stall", RelatedOnlyFieldListFilter), "status", "is_paid", "pickup_time"]
+    search_fields = ["transaction_id"]
+    actions = [
+        "export_orders_as_csv", "export_orders_with_items_as_csv", "export_orders_by_day_excel",
+        "export_orders_as_parquet", "download_receipts_zip",
+    ]
+
+    def export_orders_as_parquet(self, request, queryset):
+        archive_file = tempfile.TemporaryFile()
+        write_dataset_zip(self.export_querysets(request, queryset), archive_file)
+        archive_file.seek(0)
+        filename = f"orders_parquet_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        return FileResponse(archive_file, as_attachment=True, filename=filename, content_type='application/zip')
+
+    export_orders_as_parquet.short_description = "Export selected orders with items to Parquet (ZIP)"
+
+    def download_receipts_zip(self, request, queryset):
         if not request.user.is_superuser:
             queryset = queryset.filter(stall__owner=request.user)
 
-        wb = Workbook()
-        wb.remove(wb.active)
-
-        grouped_orders = {}
-        for order in queryset:
-            date_str = order.pickup_time.strftime('%Y-%m-%d')
-            grouped_orders.setdefault(date_str, []).append(order)
-
-        for date_str, orders in grouped_orders.items():
-            ws = wb.create_sheet(title=date_str)
-            headers = [
-                "Order ID", "User", "Stall", "Pickup Time",
-                "Total Cost", "Transaction ID", "Is Complete"
-            ]
-            ws.append(headers)
-
-            for order in orders:
-                ws.append([
-                    order.id,
-                    smart_str(order.user),
-                    smart_str(order.stall),
-                    order.pickup_time.strftime('%Y-%m-%d %H:%M'),
-                    float(order.total_cost),
-                    order.transaction_id,
-                    "Yes" if order.is_complete else "No"
-                ])
-
-            for col in range(1, len(headers)+1):
-                ws.column_dimensions[get_column_letter(col)].width = 18
-
-        response = HttpResponse(
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        filename = f"orders_by_day_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        response = StreamingHttpResponse(receipt_archive(queryset), content_type='application/zip')
+        filename = f"receipts_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        wb.save(response)
         return response
 
-    export_orders_by_day_excel.short_description = "Export orders grouped by day (Excel)"
+    download_receipts_zip.short_description = "Download receipts for selected orders (ZIP)"
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        was_pending = change and form.initial.get("status") == "Pending"
+        delta = (obj.status == "Pending") - was_pending
+        if delta:
+            transaction.on_commit(lambda: adjust_queue(obj.stall_id, delta))
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        if obj.status == "Pending":
+            transaction.on_commit(lambda: adjust_queue(obj.stall_id, -1))
+
+class ArchivedOrderAdmin(OrderExportMixin, BaseStallScopedAdmin):
+    list_display = ["user", "stall", "pickup_time", "total_cost", "transaction_id", "archived_at"]
+    list_select_related = ["user", "stall"]
+    actions = ["export_orders_as_csv", "export_orders_with_items_as_csv", "export_orders_by_day_excel"]
+
+    def has_add_permission(self, request):
+        return False
+
+class WebhookEventAdmin(BaseStallScopedAdmin):
+    list_display = ["event_id", "event_type", "status", "attempts", "received_at", "last_error"]
+    list_filter = ["status", "event_type"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class NotificationAdmin(BaseStallScopedAdmin):
+    list_display = ["channel", "recipient", "order", "status", "attempts", "created_at", "sent_at", "last_error"]
+    list_filter = ["status", "channel"]
+    list_select_related = ["order"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 admin_site.register(CustomUser, CustomUserAdmin)
 admin_site.register(Stall, StallAdmin)
@@ -188,3 +253,6 @@ admin_site.register(Voucher, VoucherAdmin)
 admin_site.register(CartItem, CartItemAdmin)
 admin_site.register(OrderItem, OrderItemAdmin)
 admin_site.register(Order, OrderAdmin)
+admin_site.register(ArchivedOrder, ArchivedOrderAdmin)
+admin_site.register(WebhookEvent, WebhookEventAdmin)
+admin_site.register(Notification, NotificationAdmin)
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+import logging
+
+from .models import Order, OrderItem, ArchivedOrder
+
+logger = logging.getLogger(__name__)
+
+ARCHIVED_FIELDS = [
+    'id', 'user_id', 'stall_id', 'created_at', 'status', 'pickup_time',
+    'total_cost', 'transaction_id', 'payment_reference', 'is_paid', 'voucher_id', 'is_complete',
+]
+
+def archivable_orders(older_than_days=None):
+    days = settings.ORDER_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    return Order.objects.filter(
+        is_complete=True, is_paid=True, created_at__lt=timezone.now() - timedelta(days=days)
+    )
+
+def archive_chunk(orders, chunk_size, after_id=0):
+    """Archive the next chunk of orders past after_id; return the last id seen and how many moved."""
+    with transaction.atomic():
+        ids = list(
+            orders.select_for_update(skip_locked=True).filter(id__gt=after_id)
+            .order_by('id').values_list('id', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return None, 0
+        last_id = ids[-1]
+        rows = {values['id']: {**values, 'items': []} for values in Order.objects.filter(id__in=ids).values(*ARCHIVED_FIELDS)}
+        for order_id, item_name, unit_price, quantity, line_total in (
+            OrderItem.objects.filter(order_id__in=ids).order_by('id')
+            .values_list('order_id', 'item_name', 'unit_price', 'quantity', 'line_total')
+        ):
+            rows[order_id]['items'].append({
+                'item_name': item_name,
+                'unit_price': str(unit_price),
+                'quantity': quantity,
+                'line_total': str(line_total),
+            })
+        # An identical archive row means the order was already copied; a
+        # different one is left for someone to look at, with the order kept.
+        for existing in ArchivedOrder.objects.filter(id__in=ids).values(*ARCHIVED_FIELDS, 'items'):
+            if rows.pop(existing['id']) != existing:
+                logger.warning("Order %s conflicts with its existing archive row; leaving it unarchived", existing['id'])
+                ids.remove(existing['id'])
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**values) for values in rows.values()])
+        Order.objects.filter(id__in=ids).delete()
+    return last_id, len(ids)
+
+def archive_orders(older_than_days=None, chunk_size=None):
+    chunk_size = chunk_size or settings.ORDER_ARCHIVE_CHUNK_SIZE
+    orders = archivable_orders(older_than_days)
+    archived = last_id = 0
+    while True:
+        last_id, moved = archive_chunk(orders, chunk_size, last_id)
+        if last_id is None:
+            return archived
+        archived += moved
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
+from datetime import timedelta
+
+from .models import CustomUser, Order, Watermark
+
+WATERMARK_NAME = "auto_blacklist_order_id"
+
+def auto_blacklist_users():
+    last_order_id = int(Watermark.objects.get_value(WATERMARK_NAME, 0))
+    cutoff = timezone.now() - timedelta(minutes=settings.BLACKLIST_UNPAID_GRACE_MINUTES)
+    orders = Order.objects.filter(id__gt=last_order_id, created_at__lte=cutoff)
+    newest_order_id = orders.aggregate(newest=Max('id'))['newest']
+    if newest_order_id is None:
+        return 0
+
+    unpaid_users = orders.filter(is_paid=False, status="Pending").values('user_id')
+    blacklisted = CustomUser.objects.filter(id__in=unpaid_users, blacklisted=False).update(blacklisted=True)
+    Watermark.objects.set_value(WATERMARK_NAME, newest_order_id)
+    return blacklisted
@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.shortcuts import get_object_or_404
+import time
+
+from .models import Stall, MenuItem, CartItem, Order
+
+MENU_VERSION_KEY = "menu:version:{stall_id}"
+MENU_SNAPSHOT_KEY = "menu:snapshot:{stall_id}:{version}"
+STALL_DIRECTORY_KEY = "stalls:directory"
+CART_COUNT_KEY = "cart:count:{user_id}"
+QUEUE_DEPTH_KEY = "queue:depth:{stall_id}"
+
+def _initial_version():
+    # Seed from the clock so an evicted counter never reuses an old snapshot key.
+    return time.time_ns()
+
+def get_menu_version(stall_id):
+    return cache.get_or_set(MENU_VERSION_KEY.format(stall_id=stall_id), _initial_version, settings.MENU_VERSION_TIMEOUT)
+
+def bump_menu_version(stall_id):
+    key = MENU_VERSION_KEY.format(stall_id=stall_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _initial_version()
+        cache.set(key, version, settings.MENU_VERSION_TIMEOUT)
+        return version
+
+def build_menu_snapshot(stall_id):
+    items = list(MenuItem.objects.filter(stall_id=stall_id).select_related('stall').order_by('id'))
+    if items:
+        stall = items[0].stall
+    else:
+        stall = get_object_or_404(Stall, id=stall_id)
+    return {
+        'stall': stall,
+        'food_items': [item for item in items if item.category == 'Food'],
+        'beverage_items': [item for item in items if item.category == 'Beverage'],
+    }
+
+def get_menu_snapshot(stall_id):
+    key = MENU_SNAPSHOT_KEY.format(stall_id=stall_id, version=get_menu_version(stall_id))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_menu_snapshot(stall_id)
+        cache.set(key, snapshot, settings.MENU_CACHE_TIMEOUT)
+    return snapshot
+
+def get_stall_directory():
+    stalls = cache.get(STALL_DIRECTORY_KEY)
+    if stalls is None:
+        stalls = list(Stall.objects.order_by('id').values('id', 'name', 'logo_filename', 'average_lead_time'))
+        cache.set(STALL_DIRECTORY_KEY, stalls, settings.MENU_CACHE_TIMEOUT)
+    return stalls
+
+def get_stall_entry(stall_id):
+    """Return ``(index, stall)`` from the directory, 1-based in id order."""
+    for _ in range(2):
+        for index, stall in enumerate(get_stall_directory(), 1):
+            if stall['id'] == stall_id:
+                return index, stall
+        # The directory may predate the stall, e.g. when another process added it.
+        invalidate_stall_directory()
+    raise Stall.DoesNotExist(f"Stall {stall_id} does not exist.")
+
+def get_stall_index(stall_id):
+    return get_stall_entry(stall_id)[0]
+
+def invalidate_stall_directory():
+    cache.delete(STALL_DIRECTORY_KEY)
+
+def get_cart_count(user_id):
+    key = CART_COUNT_KEY.format(user_id=user_id)
+    count = cache.get(key)
+    if count is None:
+        count = CartItem.objects.filter(user_id=user_id).count()
+        # The TTL bounds drift from writes that bypass the CartItem signals,
+        # such as bulk_create or raw SQL.
+        cache.set(key, count, settings.CART_COUNT_TIMEOUT)
+    return count
+
+def adjust_cart_count(user_id, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(CART_COUNT_KEY.format(user_id=user_id), delta)
+    except ValueError:
+        # Not cached yet; the next read counts the rows.
+        pass
+
+def get_queue_depth(stall_id):
+    key = QUEUE_DEPTH_KEY.format(stall_id=stall_id)
+    depth = cache.get(key)
+    if depth is None:
+        depth = Order.objects.filter(stall_id=stall_id, status="Pending").count()
+        cache.set(key, depth, settings.QUEUE_DEPTH_TIMEOUT)
+    return depth
+
+def adjust_queue_depth(stall_id, delta):
+    if not delta:
+        return
+    try:
+        cache.incr(QUEUE_DEPTH_KEY.format(stall_id=stall_id), delta)
+    except ValueError:
+        # Not cached yet; the next read counts the rows.
+        pass
+
+def reconcile_queue_depths():
+    depths = dict.fromkeys(Stall.objects.values_list('id', flat=True), 0)
+    depths.update(
+        Order.objects.filter(status="Pending").values('stall_id').annotate(depth=Count('id')).values_list('stall_id', 'depth')
+    )
+    keys = {QUEUE_DEPTH_KEY.format(stall_id=stall_id): stall_id for stall_id in depths}
+    cached = cache.get_many(keys)
+    cache.set_many({key: depths[stall_id] for key, stall_id in keys.items()}, settings.QUEUE_DEPTH_TIMEOUT)
+    return {stall_id: depths[stall_id] for key, stall_id in keys.items() if cached.get(key) != depths[stall_id]}
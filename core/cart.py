@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+
+from .cache import get_menu_snapshot
+from .models import CartItem
+
+CART_STATE_KEY = "cart:{user_id}"
+
+class DatabaseCart:
+    def __init__(self, user):
+        self.user = user
+
+    def lines(self, stall_id=None):
+        cart_items = CartItem.objects.filter(user=self.user).select_related('stall', 'item').order_by('id')
+        if stall_id is not None:
+            cart_items = cart_items.filter(stall_id=stall_id)
+        return list(cart_items)
+
+    def add(self, item, quantity=1):
+        cart_item, created = CartItem.objects.get_or_create(
+            user=self.user,
+            item=item,
+            defaults={'stall_id': item.stall_id, 'quantity': quantity},
+        )
+        if not created:
+            CartItem.objects.filter(pk=cart_item.pk).update(quantity=F('quantity') + quantity)
+
+    def change(self, item_id, delta):
+        CartItem.objects.filter(user=self.user, item_id=item_id).update(
+            quantity=Greatest(F('quantity') + delta, 1)
+        )
+
+    def remove(self, item_id):
+        CartItem.objects.filter(user=self.user, item_id=item_id).delete()
+
+    def apply(self, deltas, stall_ids):
+        with transaction.atomic():
+            cart_items = CartItem.objects.filter(user=self.user)
+            for item_id, delta in deltas.items():
+                updated = cart_items.filter(item_id=item_id).update(quantity=Greatest(F('quantity') + delta, 0))
+                if not updated and delta > 0:
+                    try:
+                        with transaction.atomic():
+                            CartItem.objects.create(
+                                user=self.user, item_id=item_id, stall_id=stall_ids[item_id], quantity=delta
+                            )
+                    except IntegrityError:
+                        cart_items.filter(item_id=item_id).update(quantity=F('quantity') + delta)
+            cart_items.filter(item_id__in=deltas, quantity=0).delete()
+
+    def clear(self, stall_id):
+        CartItem.objects.filter(user=self.user, stall_id=stall_id).delete()
+
+class CachedCart(DatabaseCart):
+    """DatabaseCart whose reads come from a per-user cache entry.
+
+    Writes still go straight to CartItem and drop the entry once committed,
+    so an evicted or lost entry only costs a reload, never cart contents.
+    Menu items come from the stall menu snapshots, so a warm read runs no
+    queries at all.
+    """
+
+    def __init__(self, user):
+        super().__init__(user)
+        self.key = CART_STATE_KEY.format(user_id=user.pk)
+
+    def items(self):
+        items = cache.get(self.key)
+        if items is None:
+            items = {
+                item_id: (stall_id, quantity)
+                for item_id, stall_id, quantity in CartItem.objects.filter(user=self.user).order_by('id').values_list(
+                    'item_id', 'stall_id', 'quantity'
+                )
+            }
+            cache.set(self.key, items, settings.CART_CACHE_TIMEOUT)
+        return items
+
+    def invalidate(self):
+        transaction.on_commit(lambda: cache.delete(self.key))
+
+    def lines(self, stall_id=None):
+        items = self.items()
+        if stall_id is not None:
+            items = {item_id: line for item_id, line in items.items() if line[0] == stall_id}
+        menu_items = {}
+        for stall_id in {stall_id for stall_id, _ in items.values()}:
+            snapshot = get_menu_snapshot(stall_id)
+            menu_items.update((item.id, item) for item in snapshot['food_items'] + snapshot['beverage_items'])
+        return [
+            CartItem(user=self.user, stall=menu_items[item_id].stall, item=menu_items[item_id], quantity=quantity)
+            for item_id, (_, quantity) in items.items()
+            if item_id in menu_items
+        ]
+
+    def add(self, item, quantity=1):
+        super().add(item, quantity)
+        self.invalidate()
+
+    def change(self, item_id, delta):
+        super().change(item_id, delta)
+        self.invalidate()
+
+    def remove(self, item_id):
+        super().remove(item_id)
+        self.invalidate()
+
+    def apply(self, deltas, stall_ids):
+        super().apply(deltas, stall_ids)
+        self.invalidate()
+
+    def clear(self, stall_id):
+        super().clear(stall_id)
+        self.invalidate()
+
+def summarize(lines):
+    stall_totals = {}
+    for line in lines:
+        stall_totals[line.stall_id] = stall_totals.get(line.stall_id, 0) + line.subtotal()
+    return {
+        'items': [
+            {'item_id': line.item_id, 'stall_id': line.stall_id, 'quantity': line.quantity, 'subtotal': str(line.subtotal())}
+            for line in lines
+        ],
+        'stall_totals': {stall_id: str(total) for stall_id, total in stall_totals.items()},
+        'count': sum(line.quantity for line in lines),
+    }
+
+def get_cart(user):
+    return import_string(settings.CART_BACKEND)(user)
@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    if settings.CACHE_IS_SHARED:
+        return []
+    return [Warning(
+        "The default cache is per process, so cache invalidation and counters do not reach other workers.",
+        hint="Point CACHE_BACKEND and CACHE_LOCATION at a shared cache such as Redis or Memcached.",
+        id="core.W001",
+    )]
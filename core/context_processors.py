@@ -1,8 +1,8 @@
-from .models import CartItem
+from .cache import get_cart_count
 
 def cart_count(request):
     if request.user.is_authenticated:
-        count = CartItem.objects.filter(user=request.user).count()
+        count = get_cart_count(request.user.pk)
     else:
         count = 0
     return {'cart_count': count}
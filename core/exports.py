@@ -0,0 +1,141 @@
+from django.conf import settings
+from django.utils.encoding import smart_str
+from openpyxl import Workbook
+from openpyxl.utils import get_column_letter
+from heapq import merge
+from operator import attrgetter, itemgetter
+import csv
+import io
+
+from .models import OrderItem, ArchivedOrder
+
+ORDER_HEADER = ["Order ID", "User", "Stall", "Pickup Time", "Total Cost", "Transaction ID", "Is Complete"]
+ITEM_HEADER = ["Item", "Unit Price", "Quantity", "Line Total"]
+
+def order_row(order):
+    return [
+        order.id,
+        smart_str(order.user),
+        smart_str(order.stall),
+        order.pickup_time,
+        order.total_cost,
+        order.transaction_id,
+        order.is_complete,
+    ]
+
+def export_orders(queryset, chunk_size=None):
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    return queryset.select_related('user', 'stall').order_by('id').iterator(chunk_size=chunk_size)
+
+def orders_with_items(queryset, chunk_size=None):
+    """Yield ``(order, item rows)`` for every order in ``queryset``.
+
+    Hot orders are merge-joined with one id-ordered OrderItem query instead of
+    a prefetch per chunk, so the export runs exactly two queries.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    if queryset.model is ArchivedOrder:
+        for order in export_orders(queryset, chunk_size):
+            yield order, [
+                [item['item_name'], item['unit_price'], item['quantity'], item['line_total']] for item in order.items
+            ]
+        return
+
+    items = (
+        OrderItem.objects.db_manager(queryset.db)
+        .filter(order__in=queryset.values('id'))
+        .order_by('order_id', 'id')
+        .values_list('order_id', 'item_name', 'unit_price', 'quantity', 'line_total')
+        .iterator(chunk_size=chunk_size)
+    )
+    item = next(items, None)
+    for order in export_orders(queryset, chunk_size):
+        rows = []
+        while item is not None and item[0] < order.id:
+            item = next(items, None)
+        while item is not None and item[0] == order.id:
+            rows.append(list(item[1:]))
+            item = next(items, None)
+        yield order, rows
+
+def as_querysets(querysets):
+    return querysets if isinstance(querysets, (list, tuple)) else [querysets]
+
+def order_csv_rows(querysets, include_items=False, chunk_size=None):
+    """Yield CSV rows for one queryset, or several with disjoint ids merged by id."""
+    querysets = as_querysets(querysets)
+    if not include_items:
+        yield ORDER_HEADER
+        for order in merge(*(export_orders(queryset, chunk_size) for queryset in querysets), key=attrgetter('id')):
+            yield order_row(order)
+        return
+
+    yield ORDER_HEADER + ITEM_HEADER
+    orders = merge(*(orders_with_items(queryset, chunk_size) for queryset in querysets), key=lambda row: row[0].id)
+    for order, items in orders:
+        for item in items or [[""] * len(ITEM_HEADER)]:
+            yield order_row(order) + item
+
+def stream_csv(rows, rows_per_chunk=None):
+    rows_per_chunk = rows_per_chunk or settings.EXPORT_CHUNK_SIZE
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if count % rows_per_chunk == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+EXCEL_COLUMNS = (
+    'id', 'user__student_id', 'user__full_name', 'stall__name',
+    'pickup_time', 'total_cost', 'transaction_id', 'is_complete',
+)
+
+def order_excel_row(order_id, student_id, full_name, stall_name, pickup_time, total_cost, transaction_id, is_complete):
+    return [
+        order_id,
+        f"{student_id} - {full_name}",
+        stall_name,
+        pickup_time.strftime('%Y-%m-%d %H:%M'),
+        float(total_cost),
+        transaction_id,
+        "Yes" if is_complete else "No",
+    ]
+
+def add_order_sheet(workbook, title):
+    sheet = workbook.create_sheet(title=title)
+    # Write-only sheets only accept column widths before the first row.
+    for col in range(1, len(ORDER_HEADER) + 1):
+        sheet.column_dimensions[get_column_letter(col)].width = 18
+    sheet.append(ORDER_HEADER)
+    return sheet
+
+def write_orders_by_day_xlsx(querysets, file, chunk_size=None):
+    """Write one sheet per pickup date from a pickup-ordered query per queryset.
+
+    Rows come from joined value tuples rather than model instances, and the
+    workbook is write-only, so each row is serialized as soon as it arrives.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_date = None
+    orders = merge(
+        *(
+            queryset.order_by('pickup_time', 'id').values_list(*EXCEL_COLUMNS).iterator(chunk_size=chunk_size)
+            for queryset in as_querysets(querysets)
+        ),
+        key=itemgetter(4, 0),
+    )
+    for values in orders:
+        row = order_excel_row(*values)
+        date_str = row[3][:10]
+        if date_str != sheet_date:
+            sheet = add_order_sheet(workbook, date_str)
+            sheet_date = date_str
+        sheet.append(row)
+    if sheet is None:
+        add_order_sheet(workbook, "Orders")
+    workbook.save(file)
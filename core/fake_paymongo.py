@@ -0,0 +1,111 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import itertools
+import json
+import threading
+import time
+
+class FakePayMongoHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client gave up, e.g. a timeout test against ``delay``.
+            pass
+
+    def do_GET(self):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        fake.requests.append((self.path, None))
+        if fake.fail_statuses:
+            self.send_json(fake.fail_statuses.pop(0), {"errors": [{"detail": "Simulated failure"}]})
+            return
+        if url.path.rstrip("/").endswith("/payments"):
+            query = parse_qs(url.query)
+            limit = int(query.get("limit", ["10"])[0])
+            payments = fake.payments
+            if "after" in query:
+                ids = [payment["id"] for payment in payments]
+                payments = payments[ids.index(query["after"][0]) + 1:]
+            self.send_json(200, {"data": payments[:limit], "has_more": len(payments) > limit})
+            return
+        self.send_json(404, {"errors": [{"detail": "Not found"}]})
+
+    def do_POST(self):
+        fake = self.server.fake
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        fake.requests.append((self.path, body))
+        if fake.delay:
+            time.sleep(fake.delay)
+        if fake.fail_statuses:
+            self.send_json(fake.fail_statuses.pop(0), {"errors": [{"detail": "Simulated failure"}]})
+            return
+        if self.path.rstrip("/").endswith("/checkout_sessions"):
+            session_id = f"cs_fake_{next(fake.ids)}"
+            self.send_json(200, {
+                "data": {
+                    "id": session_id,
+                    "type": "checkout_session",
+                    "attributes": dict(
+                        body.get("data", {}).get("attributes", {}),
+                        checkout_url=f"{fake.url}/checkout/{session_id}",
+                    ),
+                }
+            })
+            return
+        self.send_json(404, {"errors": [{"detail": "Not found"}]})
+
+class FakePayMongo:
+    """Local stand-in for the PayMongo API.
+
+    Use as a context manager and point ``PAYMONGO_API_BASE`` at ``url``.
+    ``delay`` slows every response; ``fail_statuses`` are returned, in order,
+    before requests start succeeding. ``payments`` is served newest first
+    from ``GET /payments``; add to it with ``add_payment``.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, delay=0, fail_statuses=None):
+        self.server = ThreadingHTTPServer((host, port), FakePayMongoHandler)
+        self.server.daemon_threads = True
+        self.server.fake = self
+        self.delay = delay
+        self.fail_statuses = list(fail_statuses or [])
+        self.requests = []
+        self.payments = []
+        self.ids = itertools.count(1)
+        self.url = f"http://{host}:{self.server.server_address[1]}/v1"
+        self.thread = None
+
+    def add_payment(self, description, status="paid", created_at=None, reference=None):
+        payment_id = f"pay_fake_{next(self.ids)}"
+        created_at = created_at or int(time.time())
+        attributes = {"description": description, "status": status, "created_at": created_at}
+        if reference:
+            attributes["metadata"] = {"payment_reference": reference}
+        self.payments.insert(0, {"id": payment_id, "type": "payment", "attributes": attributes})
+        return payment_id
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
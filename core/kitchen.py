@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
+
+from .models import Order, Notification
+from .notifications import order_ready_notifications
+from .pagination import keyset_page
+from .scheduling import adjust_queue
+from . import pubsub
+
+def kitchen_queue(stall_id, cursor=None, limit=None):
+    orders = Order.objects.filter(
+        stall_id=stall_id, is_complete=False, status__in=["Pending", "Ready"]
+    ).select_related('user')
+    page, next_cursor = keyset_page(orders, 'pickup_time', cursor, limit or settings.KITCHEN_PAGE_SIZE)
+    prefetch_related_objects(page, 'orderitem_set')
+    return page, next_cursor
+
+def publish_ready(order):
+    adjust_queue(order.stall_id, -1)
+    pubsub.publish_order(order.id, order.transaction_id, order.status, order.is_paid)
+
+def set_ready(order):
+    # Only the click that moves the order out of Pending notifies and publishes;
+    # repeats and cancelled orders leave it as it is.
+    was_pending = Order.objects.filter(pk=order.pk, status="Pending").update(status="Ready", updated_at=timezone.now())
+    if was_pending:
+        transaction.on_commit(lambda: publish_ready(order))
+    return was_pending
+
+def mark_ready(order):
+    with transaction.atomic():
+        was_pending = set_ready(order)
+        order.refresh_from_db(fields=['status', 'is_paid', 'is_complete'])
+        if was_pending:
+            Notification.objects.bulk_create(order_ready_notifications(order))
+    return was_pending
+
+def mark_complete(order):
+    with transaction.atomic():
+        set_ready(order)
+        completed = (
+            Order.objects.filter(pk=order.pk, is_complete=False)
+            .exclude(status="Cancelled")
+            .update(is_complete=True, updated_at=timezone.now())
+        )
+        order.refresh_from_db(fields=['status', 'is_paid', 'is_complete'])
+    # The receipt is left to render_receipts (or the first download) so the
+    # kitchen's request never waits on a PDF.
+    return completed
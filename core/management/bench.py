@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+from django.core.management import call_command
+from django.db import connections
+from datetime import timedelta
+import os
+import random
+import tempfile
+
+from core.models import CustomUser, Stall, Order
+
+BENCH_ALIAS = "bench"
+
+def add_dataset_arguments(parser):
+    parser.add_argument("--orders", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--stalls", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+
+@contextmanager
+def bench_database():
+    """Migrate a throwaway SQLite database under BENCH_ALIAS and delete it afterwards."""
+    fd, path = tempfile.mkstemp(suffix=".sqlite3")
+    os.close(fd)
+    connections.databases[BENCH_ALIAS] = dict(connections.databases["default"], NAME=path)
+    try:
+        call_command("migrate", database=BENCH_ALIAS, verbosity=0)
+        yield BENCH_ALIAS
+    finally:
+        connections[BENCH_ALIAS].close()
+        del connections.databases[BENCH_ALIAS]
+        os.remove(path)
+
+def create_stalls_and_users(options):
+    random.seed(0)
+    Stall.objects.using(BENCH_ALIAS).bulk_create([Stall(name=f"Stall {i}") for i in range(options["stalls"])])
+    CustomUser.objects.using(BENCH_ALIAS).bulk_create(
+        [CustomUser(student_id=f"{i:08d}", full_name=f"Student {i}", password="!") for i in range(options["users"])],
+        batch_size=options["batch_size"],
+    )
+    return (
+        list(Stall.objects.using(BENCH_ALIAS).values_list("id", flat=True)),
+        list(CustomUser.objects.using(BENCH_ALIAS).values_list("id", flat=True)),
+    )
+
+def sequence_batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield range(start + 1, min(start + batch_size, count) + 1)
+
+def random_order(sequence, stall_ids, user_ids, now, **fields):
+    created_at = now - timedelta(minutes=random.randrange(60 * 24 * 120))
+    return Order(**{
+        'user_id': random.choice(user_ids),
+        'stall_id': random.choice(stall_ids),
+        'created_at': created_at,
+        'pickup_time': created_at + timedelta(minutes=30),
+        'total_cost': 100,
+        'transaction_id': f"B{sequence:09d}",
+        **fields,
+    })
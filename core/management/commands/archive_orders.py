@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core.archive import archive_orders
+
+class Command(BaseCommand):
+    help = "Move completed, paid orders older than the cutoff into the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS)
+        parser.add_argument("--chunk-size", type=int, default=settings.ORDER_ARCHIVE_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        archived = archive_orders(options["days"], options["chunk_size"])
+        self.stdout.write(f"Archived {archived} order(s).")
@@ -0,0 +1,90 @@
+from django.core.management import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from django.utils.encoding import smart_str
+import csv
+import io
+import time
+import tracemalloc
+
+from core.exports import order_csv_rows, stream_csv
+from core.management.bench import (
+    BENCH_ALIAS, add_dataset_arguments, bench_database, create_stalls_and_users, random_order, sequence_batches,
+)
+from core.models import Order, OrderItem
+
+def legacy_export(queryset):
+    # The pre-streaming admin action: one buffered response, two lazy lookups per row.
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for order in queryset:
+        writer.writerow([
+            order.id, smart_str(order.user), smart_str(order.stall), order.pickup_time,
+            order.total_cost, order.transaction_id, order.is_complete,
+        ])
+    return [buffer.getvalue()]
+
+class Command(BaseCommand):
+    help = "Measure peak traced memory, query count and time of the streaming order CSV export."
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument("--items-per-order", type=int, default=2)
+        parser.add_argument("--legacy-orders", type=int, default=2_000,
+                            help="Rows to run the old per-row export on for comparison.")
+
+    def handle(self, *args, **options):
+        with bench_database():
+            self.generate(options)
+            orders = Order.objects.using(BENCH_ALIAS)
+            self.stdout.write(f"{'export':<24}{'rows':>10}{'queries':>10}{'peak MiB':>10}{'seconds':>10}{'MiB out':>10}")
+            legacy = orders.filter(id__lte=options["legacy_orders"]).order_by("id")
+            self.report("legacy", options["legacy_orders"], lambda: legacy_export(legacy))
+            size = max(options["orders"] // 100, 1)
+            while True:
+                subset = orders.filter(id__lte=size) if size < options["orders"] else orders.all()
+                self.report("streaming", size, lambda: stream_csv(order_csv_rows(subset)))
+                self.report("streaming + items", size, lambda: stream_csv(order_csv_rows(subset, include_items=True)))
+                if size == options["orders"]:
+                    break
+                size = min(size * 10, options["orders"])
+
+    def report(self, name, rows, export):
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        written = 0
+        with connections[BENCH_ALIAS].execute_wrapper(count_query):
+            for chunk in export():
+                written += len(chunk)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"{name:<24}{rows:>10}{queries:>10}{peak / 2**20:>10.1f}{elapsed:>10.2f}{written / 2**20:>10.1f}"
+        )
+
+    def generate(self, options):
+        stall_ids, user_ids = create_stalls_and_users(options)
+        now = timezone.now()
+        for sequences in sequence_batches(options["orders"], options["batch_size"]):
+            orders = []
+            items = []
+            for order_id in sequences:
+                orders.append(random_order(
+                    order_id, stall_ids, user_ids, now,
+                    id=order_id, status="Ready", is_complete=True, is_paid=True,
+                    total_cost=100 * options["items_per_order"],
+                ))
+                items += [
+                    OrderItem(order_id=order_id, item_name=f"Item {i}", unit_price=100, quantity=1, line_total=100)
+                    for i in range(options["items_per_order"])
+                ]
+            Order.objects.using(BENCH_ALIAS).bulk_create(orders)
+            OrderItem.objects.using(BENCH_ALIAS).bulk_create(items)
@@ -0,0 +1,107 @@
+from django.core.management import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from datetime import timedelta
+import copy
+import random
+import statistics
+import time
+
+from core.management.bench import (
+    BENCH_ALIAS, add_dataset_arguments, bench_database, create_stalls_and_users, random_order, sequence_batches,
+)
+from core.models import MenuItem, CartItem, Order
+
+class Command(BaseCommand):
+    help = "Time the hot Order/CartItem queries on a generated dataset, with and without the composite indexes."
+
+    def add_arguments(self, parser):
+        add_dataset_arguments(parser)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        with bench_database():
+            self.generate(options)
+            with_indexes = self.run_queries(options["repeat"])
+            self.drop_indexes()
+            without_indexes = self.run_queries(options["repeat"])
+
+        self.stdout.write(f"{'query':<28}{'no index (ms)':>16}{'indexed (ms)':>16}{'speedup':>10}")
+        for name, indexed in with_indexes.items():
+            before = without_indexes[name]
+            self.stdout.write(f"{name:<28}{before:>16.3f}{indexed:>16.3f}{before / indexed:>9.1f}x")
+
+    def generate(self, options):
+        db = BENCH_ALIAS
+        batch_size = options["batch_size"]
+        stall_ids, user_ids = create_stalls_and_users(options)
+        MenuItem.objects.using(db).bulk_create([
+            MenuItem(stall_id=stall_id, name=f"Item {stall_id}-{i}", price=100, category="Food")
+            for stall_id in stall_ids for i in range(10)
+        ])
+        items = list(MenuItem.objects.using(db).values_list("id", "stall_id"))
+        CartItem.objects.using(db).bulk_create([
+            CartItem(user_id=user_id, item_id=item_id, stall_id=stall_id, quantity=1)
+            for user_id in user_ids for item_id, stall_id in random.sample(items, 3)
+        ], batch_size=batch_size)
+
+        now = timezone.now()
+        for sequences in sequence_batches(options["orders"], batch_size):
+            batch = []
+            for sequence in sequences:
+                is_complete = random.random() < 0.95
+                batch.append(random_order(
+                    sequence, stall_ids, user_ids, now,
+                    status="Ready" if is_complete else "Pending",
+                    is_complete=is_complete,
+                    is_paid=is_complete or random.random() < 0.5,
+                ))
+            Order.objects.using(db).bulk_create(batch)
+        with connections[db].cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        self.sample_user = random.choice(user_ids)
+        self.sample_stall = random.choice(stall_ids)
+        self.sample_transaction_id = f"B{random.randrange(1, options['orders'] + 1):09d}"
+
+    def drop_indexes(self):
+        with connections[BENCH_ALIAS].schema_editor() as editor:
+            old_field = Order._meta.get_field("transaction_id")
+            new_field = copy.copy(old_field)
+            new_field.db_index = False
+            editor.alter_field(Order, old_field, new_field)
+            for model in (Order, CartItem):
+                for index in model._meta.indexes:
+                    editor.remove_index(model, index)
+            for constraint in CartItem._meta.constraints:
+                editor.remove_constraint(CartItem, constraint)
+        with connections[BENCH_ALIAS].cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def run_queries(self, repeat):
+        orders = Order.objects.using(BENCH_ALIAS)
+        day_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        queries = {
+            "user pending orders": lambda: list(orders.filter(user_id=self.sample_user, is_complete=False)),
+            "user order history": lambda: list(orders.filter(user_id=self.sample_user).order_by("-created_at")[:20]),
+            "stall pending count": lambda: orders.filter(stall_id=self.sample_stall, status="Pending").count(),
+            "stall orders today": lambda: orders.filter(
+                stall_id=self.sample_stall, created_at__gte=day_start, created_at__lt=day_start + timedelta(days=1)
+            ).count(),
+            "unpaid pending users": lambda: list(
+                orders.filter(is_paid=False, status="Pending").values_list("user_id", flat=True)
+            ),
+            "transaction lookup": lambda: orders.filter(transaction_id=self.sample_transaction_id).first(),
+            "cart by user and stall": lambda: list(
+                CartItem.objects.using(BENCH_ALIAS).filter(user_id=self.sample_user, stall_id=self.sample_stall)
+            ),
+        }
+        results = {}
+        for name, query in queries.items():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                query()
+                timings.append((time.perf_counter() - start) * 1000)
+            results[name] = statistics.median(timings)
+        return results
@@ -0,0 +1,10 @@
+from django.core.management import BaseCommand
+
+from core.blacklist import auto_blacklist_users
+
+class Command(BaseCommand):
+    help = "Blacklist users with unpaid pending orders placed since the last run."
+
+    def handle(self, *args, **options):
+        blacklisted = auto_blacklist_users()
+        self.stdout.write(f"Blacklisted {blacklisted} user(s).")
@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+import time
+
+from core.notifications import dispatch_pending
+
+class Command(BaseCommand):
+    help = "Send pending email/SMS notifications in batches over reused connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.NOTIFICATION_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting once the outbox is drained.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep between polls when idle.")
+
+    def handle(self, *args, **options):
+        while True:
+            results = dispatch_pending(options["batch_size"])
+            for channel, (sent, failed, elapsed) in results.items():
+                if sent or failed:
+                    rate = sent / elapsed if elapsed else 0
+                    self.stdout.write(f"{channel}: sent {sent}, failed {failed} in {elapsed:.2f}s ({rate:.1f}/s)")
+            if any(sent or failed for sent, failed, _ in results.values()):
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
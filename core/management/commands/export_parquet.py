@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from core.parquet import export_parquet
+
+class Command(BaseCommand):
+    help = "Export orders, order items, menu items and stalls as Parquet partitioned by stall and date."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--root", default=settings.PARQUET_EXPORT_ROOT)
+        parser.add_argument("--full", action="store_true", help="Rebuild the whole export in a fresh directory and swap it in.")
+        parser.add_argument("--chunk-size", type=int, default=settings.EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        written = export_parquet(options["root"], options["full"], options["chunk_size"])
+        self.stdout.write(
+            f"Wrote {written['orders']} order partition(s) and {written['order_items']} order item partition(s)."
+        )
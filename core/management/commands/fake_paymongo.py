@@ -0,0 +1,21 @@
+from django.core.management import BaseCommand
+
+from core.fake_paymongo import FakePayMongo
+
+class Command(BaseCommand):
+    help = "Run a local stand-in for the PayMongo API (point PAYMONGO_API_BASE at it)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8090)
+        parser.add_argument("--delay", type=float, default=0)
+
+    def handle(self, *args, **options):
+        fake = FakePayMongo(options["host"], options["port"], delay=options["delay"])
+        self.stdout.write(f"Fake PayMongo listening on {fake.url}")
+        try:
+            fake.server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            fake.server.server_close()
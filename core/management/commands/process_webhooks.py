@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+import time
+
+from core.webhooks import process_pending_events
+
+class Command(BaseCommand):
+    help = "Drain the PayMongo webhook inbox and apply payment updates in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=settings.WEBHOOK_BATCH_SIZE)
+        parser.add_argument("--loop", action="store_true", help="Keep polling instead of exiting once the inbox is drained.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds to sleep between polls when idle.")
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            processed = process_pending_events(options["batch_size"])
+            total += processed
+            if processed:
+                continue
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+        self.stdout.write(f"Processed {total} webhook event(s).")
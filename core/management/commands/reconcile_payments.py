@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand, CommandError
+
+from core.paymongo import PayMongoError
+from core.reconciliation import reconcile_payments
+
+class Command(BaseCommand):
+    help = "Mark orders paid from PayMongo payments created since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=100)
+
+    def handle(self, *args, **options):
+        try:
+            pages, paid_orders = reconcile_payments(options["page_size"])
+        except PayMongoError as exc:
+            raise CommandError(f"Reconciliation failed: {exc}")
+        self.stdout.write(f"Read {pages} page(s) of payments, marked {paid_orders} order(s) paid.")
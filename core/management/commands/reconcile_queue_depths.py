@@ -0,0 +1,12 @@
+from django.core.management import BaseCommand
+
+from core.cache import reconcile_queue_depths
+
+class Command(BaseCommand):
+    help = "Reset the cached per-stall pending order counters from the database."
+
+    def handle(self, *args, **options):
+        drift = reconcile_queue_depths()
+        for stall_id, depth in drift.items():
+            self.stdout.write(f"Stall {stall_id}: queue depth corrected to {depth}.")
+        self.stdout.write(f"Reconciled queue depths, {len(drift)} stall(s) drifted.")
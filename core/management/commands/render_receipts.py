@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+import time
+
+from core.receipts import render_missing_receipts, sweep_stale_receipts
+
+class Command(BaseCommand):
+    help = "Render receipt PDFs for paid or completed orders that have none on disk, then delete stale renders."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+        parser.add_argument("--chunk-size", type=int, default=settings.RECEIPT_RENDER_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        rendered = render_missing_receipts(options["workers"], options["chunk_size"])
+        removed = sweep_stale_receipts()
+        self.stdout.write(
+            f"Rendered {rendered} receipt(s) and removed {removed} stale one(s) in {time.perf_counter() - started:.1f}s."
+        )
@@ -0,0 +1,24 @@
+from django.shortcuts import render
+
+from .models import Order
+
+BLACKLIST_EXEMPT_URL_NAMES = {
+    'login', 'logout', 'signup', 'test_logout', 'paymongo_webhook', 'admin_login', 'admin_logout',
+}
+
+class BlacklistMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        if match.url_name in BLACKLIST_EXEMPT_URL_NAMES or match.namespace == 'jsecadmin':
+            return None
+        user = request.user
+        if not user.is_authenticated or not user.blacklisted:
+            return None
+        unpaid_orders = Order.objects.filter(user=user, is_paid=False)
+        return render(request, 'core/blacklisted.html', {'orders': unpaid_orders}, status=403)
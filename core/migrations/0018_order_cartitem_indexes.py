@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:08
+
+import core.models
+from django.db import migrations, models
+from django.db.models import Min, Sum, Count
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    CartItem = apps.get_model("core", "CartItem")
+    cart_items = CartItem.objects.using(schema_editor.connection.alias)
+    duplicates = (
+        cart_items.values("user_id", "item_id")
+        .annotate(keep_id=Min("id"), total=Sum("quantity"), rows=Count("id"))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        cart_items.filter(id=row["keep_id"]).update(quantity=row["total"])
+        cart_items.filter(user_id=row["user_id"], item_id=row["item_id"]).exclude(id=row["keep_id"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0017_alter_order_is_paid"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="order",
+            name="transaction_id",
+            field=models.CharField(db_index=True, default=core.models.default_transaction_id, max_length=50),
+        ),
+        migrations.AddIndex(
+            model_name="cartitem",
+            index=models.Index(fields=["user", "stall"], name="cartitem_user_stall_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["user", "is_complete"], name="order_user_complete_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["user", "created_at"], name="order_user_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["stall", "status"], name="order_stall_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["stall", "created_at"], name="order_stall_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["status", "is_paid", "user"], name="order_status_paid_user_idx"),
+        ),
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(fields=("user", "item"), name="cartitem_unique_user_item"),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0018_order_cartitem_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stall",
+            name="slot_capacity",
+            field=models.PositiveIntegerField(default=10),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(fields=["stall", "pickup_time"], name="order_stall_pickup_idx"),
+        ),
+    ]
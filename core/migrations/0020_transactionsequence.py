@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def seed_sequences(apps, schema_editor):
+    Order = apps.get_model("core", "Order")
+    TransactionSequence = apps.get_model("core", "TransactionSequence")
+    db_alias = schema_editor.connection.alias
+    daily_counts = (
+        Order.objects.using(db_alias)
+        .annotate(day=TruncDate("created_at"))
+        .values("stall_id", "day")
+        .annotate(orders=Count("id"))
+    )
+    TransactionSequence.objects.using(db_alias).bulk_create([
+        TransactionSequence(stall_id=row["stall_id"], date=row["day"], last_number=row["orders"])
+        for row in daily_counts
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0019_stall_slot_capacity_order_pickup_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TransactionSequence",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("last_number", models.PositiveIntegerField(default=0)),
+                ("stall", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="core.stall")),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("stall", "date"), name="transactionsequence_unique_stall_date")],
+            },
+        ),
+        migrations.RunPython(seed_sequences, migrations.RunPython.noop),
+    ]
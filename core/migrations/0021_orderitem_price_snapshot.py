@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def snapshot_prices(apps, schema_editor):
+    OrderItem = apps.get_model("core", "OrderItem")
+    order_items = list(OrderItem.objects.using(schema_editor.connection.alias).select_related("item"))
+    for order_item in order_items:
+        order_item.item_name = order_item.item.name
+        order_item.unit_price = order_item.item.price
+        order_item.line_total = order_item.item.price * order_item.quantity
+    OrderItem.objects.using(schema_editor.connection.alias).bulk_update(
+        order_items, ["item_name", "unit_price", "line_total"], batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0020_transactionsequence"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="item_name",
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="line_total",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="item",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to="core.menuitem"),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0025_order_kitchen_queue_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("created_at", models.DateTimeField()),
+                ("status", models.CharField(choices=[("Pending", "Pending"), ("Ready", "Ready"), ("Cancelled", "Cancelled")], max_length=50)),
+                ("pickup_time", models.DateTimeField()),
+                ("total_cost", models.DecimalField(decimal_places=2, max_digits=10)),
+                ("transaction_id", models.CharField(max_length=50)),
+                ("is_paid", models.BooleanField(default=True)),
+                ("is_complete", models.BooleanField(default=True)),
+                ("items", models.JSONField(default=list)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                ("stall", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="core.stall")),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ("voucher", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to="core.voucher")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["user", "created_at"], name="archivedorder_user_created_idx"), models.Index(fields=["stall", "pickup_time"], name="archivedorder_stall_pickup_idx")],
+            },
+        ),
+    ]
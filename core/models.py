@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
 from django.utils import timezone
@@ -49,6 +49,7 @@ class Stall(models.Model):
     logo_filename = models.CharField(max_length=100, blank=True, null=True)
     average_lead_time = models.IntegerField(default=15)
     closing_time = models.TimeField(null=True, blank=True)
+    slot_capacity = models.PositiveIntegerField(default=10)
 
     def __str__(self):
         return self.name
@@ -74,6 +75,14 @@ class CartItem(models.Model):
     item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'stall'], name='cartitem_user_stall_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'item'], name='cartitem_unique_user_item'),
+        ]
+
     def subtotal(self):
         return self.item.price * self.quantity
 
@@ -105,22 +114,63 @@ class Order(models.Model):
     status = models.CharField(max_length=50, choices=ORDER_STATUS_CHOICES, default='Pending')
     pickup_time = models.DateTimeField(default=default_pickup_time)
     total_cost = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
-    transaction_id = models.CharField(max_length=50, default=default_transaction_id)
+    transaction_id = models.CharField(max_length=50, default=default_transaction_id, db_index=True)
+    # transaction_id restarts every day; PayMongo payments carry this instead.
+    payment_reference = models.CharField(max_length=32, unique=True, null=True, blank=True, editable=False)
     is_paid = models.BooleanField(default=False)
     voucher = models.ForeignKey('Voucher', on_delete=models.SET_NULL, null=True, blank=True, default=None)
     is_complete = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'is_complete'], name='order_user_complete_idx'),
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+            models.Index(fields=['stall', 'status'], name='order_stall_status_idx'),
+            models.Index(fields=['stall', 'created_at'], name='order_stall_created_idx'),
+            models.Index(fields=['stall', 'pickup_time'], name='order_stall_pickup_idx'),
+            models.Index(fields=['stall', 'is_complete', 'pickup_time'], name='order_kitchen_queue_idx'),
+            models.Index(fields=['status', 'is_paid', 'user'], name='order_status_paid_user_idx'),
+            models.Index(fields=['updated_at'], name='order_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.transaction_id} - {self.user.full_name}"
 
+class TransactionSequenceManager(models.Manager):
+    def next_number(self, stall, date):
+        with transaction.atomic(using=self._db):
+            sequence, _ = self.select_for_update().get_or_create(stall=stall, date=date)
+            self.filter(pk=sequence.pk).update(last_number=models.F('last_number') + 1)
+            sequence.refresh_from_db(fields=['last_number'])
+        return sequence.last_number
+
+class TransactionSequence(models.Model):
+    stall = models.ForeignKey(Stall, on_delete=models.CASCADE)
+    date = models.DateField()
+    last_number = models.PositiveIntegerField(default=0)
+
+    objects = TransactionSequenceManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['stall', 'date'], name='transactionsequence_unique_stall_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.stall.name} {self.date}: {self.last_number}"
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
-    item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
+    item = models.ForeignKey(MenuItem, on_delete=models.SET_NULL, null=True, blank=True)
+    item_name = models.CharField(max_length=100, blank=True)
+    unit_price = models.DecimalField(max_digits=6, decimal_places=2, default=0)
     quantity = models.PositiveIntegerField(default=1)
+    line_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     voucher = models.ForeignKey('Voucher', on_delete=models.SET_NULL, null=True, blank=True)
 
     def __str__(self):
-        return f"{self.item.name} × {self.quantity} ({self.order.transaction_id})"
+        return f"{self.item_name} × {self.quantity} ({self.order.transaction_id})"
 
 class Voucher(models.Model):
     stall = models.ForeignKey(Stall, on_delete=models.CASCADE, related_name='vouchers')
@@ -130,3 +180,107 @@ class Voucher(models.Model):
 
     def __str__(self):
         return f"{self.code} - ₱{self.discount_amount} ({'Active' if self.is_active else 'Inactive'})"
+
+WEBHOOK_STATUS_CHOICES = [
+    ("Pending", "Pending"),
+    ("Processed", "Processed"),
+    ("Dead", "Dead"),
+]
+
+class WebhookEvent(models.Model):
+    event_id = models.CharField(max_length=100, unique=True)
+    event_type = models.CharField(max_length=100)
+    payload = models.TextField()
+    status = models.CharField(max_length=20, choices=WEBHOOK_STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='webhookevent_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id} ({self.event_type}) - {self.status}"
+
+class WatermarkManager(models.Manager):
+    def get_value(self, name, default=None):
+        value = self.filter(name=name).values_list('value', flat=True).first()
+        return default if value is None else value
+
+    def set_value(self, name, value):
+        self.update_or_create(name=name, defaults={'value': str(value)})
+
+class Watermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    value = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = WatermarkManager()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+NOTIFICATION_CHANNEL_CHOICES = [
+    ("Email", "Email"),
+    ("SMS", "SMS"),
+]
+
+NOTIFICATION_STATUS_CHOICES = [
+    ("Pending", "Pending"),
+    ("Sent", "Sent"),
+    ("Failed", "Failed"),
+]
+
+class Notification(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
+    channel = models.CharField(max_length=10, choices=NOTIFICATION_CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=NOTIFICATION_STATUS_CHOICES, default='Pending')
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'channel', 'next_attempt_at'], name='notification_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} - {self.status}"
+
+class ArchivedOrder(models.Model):
+    # Keeps the original Order id so hot and archived rows never collide.
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    stall = models.ForeignKey(Stall, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    status = models.CharField(max_length=50, choices=ORDER_STATUS_CHOICES)
+    pickup_time = models.DateTimeField()
+    total_cost = models.DecimalField(max_digits=10, decimal_places=2)
+    transaction_id = models.CharField(max_length=50)
+    payment_reference = models.CharField(max_length=32, null=True, blank=True)
+    is_paid = models.BooleanField(default=True)
+    voucher = models.ForeignKey('Voucher', on_delete=models.SET_NULL, null=True, blank=True)
+    is_complete = models.BooleanField(default=True)
+    items = models.JSONField(default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='archivedorder_user_created_idx'),
+            models.Index(fields=['stall', 'pickup_time'], name='archivedorder_stall_pickup_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_id} - {self.user.full_name} (archived)"
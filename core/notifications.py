@@ -0,0 +1,156 @@
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from abc import ABC, abstractmethod
+from datetime import timedelta
+import logging
+import time
+
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+class SMSGateway(ABC):
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def send(self, recipient, body):
+        ...
+
+class ConsoleSMSGateway(SMSGateway):
+    def send(self, recipient, body):
+        logger.info("SMS to %s: %s", recipient, body)
+
+def get_sms_gateway():
+    return import_string(settings.SMS_GATEWAY)()
+
+def order_ready_notifications(order):
+    user = order.user
+    notifications = []
+    if user.email:
+        notifications.append(Notification(
+            user=user,
+            order=order,
+            channel="Email",
+            recipient=user.email,
+            subject="Your order is ready!",
+            body=f"Hi {user.full_name},\n\nYour order {order.transaction_id} from {order.stall.name} is ready for pickup!",
+        ))
+    if user.contact_number:
+        notifications.append(Notification(
+            user=user,
+            order=order,
+            channel="SMS",
+            recipient=user.contact_number,
+            body=f"Order {order.transaction_id} ready for pickup!",
+        ))
+    return notifications
+
+class EmailChannel:
+    def __init__(self):
+        self.connection = get_connection()
+
+    def open(self):
+        self.connection.open()
+
+    def close(self):
+        self.connection.close()
+
+    def send(self, notification):
+        EmailMessage(
+            subject=notification.subject,
+            body=notification.body,
+            from_email=settings.NOTIFICATION_FROM_EMAIL,
+            to=[notification.recipient],
+            connection=self.connection,
+        ).send()
+
+class SMSChannel:
+    def __init__(self):
+        self.gateway = get_sms_gateway()
+
+    def open(self):
+        self.gateway.open()
+
+    def close(self):
+        self.gateway.close()
+
+    def send(self, notification):
+        self.gateway.send(notification.recipient, notification.body)
+
+CHANNELS = {
+    "Email": EmailChannel,
+    "SMS": SMSChannel,
+}
+
+def claim_due(channel_name, batch_size, current_time):
+    # Lease the batch by pushing next_attempt_at past the send window, so the
+    # row locks are released before any SMTP/SMS round trips begin.
+    with transaction.atomic():
+        notifications = list(
+            Notification.objects.select_for_update(skip_locked=True)
+            .filter(status="Pending", channel=channel_name, next_attempt_at__lte=current_time)
+            .order_by('id')[:batch_size]
+        )
+        Notification.objects.filter(id__in=[n.id for n in notifications]).update(
+            next_attempt_at=current_time + timedelta(seconds=settings.NOTIFICATION_LEASE_SECONDS)
+        )
+    return notifications
+
+def record_failure(notification, exc, current_time):
+    notification.last_error = repr(exc)
+    if notification.attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+        notification.status = "Failed"
+    else:
+        notification.next_attempt_at = current_time + timedelta(
+            seconds=settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** (notification.attempts - 1)
+        )
+
+def dispatch_channel(channel_name, batch_size):
+    current_time = timezone.now()
+    notifications = claim_due(channel_name, batch_size, current_time)
+    if not notifications:
+        return 0, 0, 0.0
+
+    started = time.perf_counter()
+    sent = 0
+    try:
+        channel = CHANNELS[channel_name]()
+        channel.open()
+    except Exception as exc:
+        # The whole batch counts as one failed attempt; the caller moves on to
+        # the next channel.
+        logger.exception("Could not open the %s channel", channel_name)
+        for notification in notifications:
+            notification.attempts += 1
+            record_failure(notification, exc, current_time)
+    else:
+        try:
+            for notification in notifications:
+                notification.attempts += 1
+                try:
+                    channel.send(notification)
+                except Exception as exc:
+                    record_failure(notification, exc, current_time)
+                else:
+                    notification.status = "Sent"
+                    notification.sent_at = timezone.now()
+                    sent += 1
+        finally:
+            channel.close()
+    elapsed = time.perf_counter() - started
+
+    Notification.objects.bulk_update(
+        notifications, ['attempts', 'status', 'sent_at', 'last_error', 'next_attempt_at']
+    )
+    return sent, len(notifications) - sent, elapsed
+
+def dispatch_pending(batch_size=None):
+    batch_size = batch_size or settings.NOTIFICATION_BATCH_SIZE
+    return {channel_name: dispatch_channel(channel_name, batch_size) for channel_name in CHANNELS}
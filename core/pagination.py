@@ -0,0 +1,39 @@
+from django.db.models import Q
+from datetime import datetime
+
+def encode_cursor(value, pk):
+    return f"{value.isoformat()},{pk}"
+
+def decode_cursor(cursor):
+    value, pk = cursor.rsplit(",", 1)
+    return datetime.fromisoformat(value), int(pk)
+
+def keyset_page(querysets, field, cursor=None, limit=50, descending=False):
+    """Return one page ordered by ``(field, id)`` and the cursor for the next.
+
+    ``querysets`` may be a single queryset or several whose ids do not
+    overlap (e.g. hot and archived orders); each is read once and merged.
+    Raises ValueError for a malformed cursor.
+    """
+    if not isinstance(querysets, (list, tuple)):
+        querysets = [querysets]
+    lookup = "lt" if descending else "gt"
+    after = None
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        after = Q(**{f"{field}__{lookup}": value}) | Q(**{field: value, f"id__{lookup}": pk})
+    ordering = [f"-{field}", "-id"] if descending else [field, "id"]
+
+    page = []
+    for queryset in querysets:
+        if after is not None:
+            queryset = queryset.filter(after)
+        page += queryset.order_by(*ordering)[:limit + 1]
+    if len(querysets) > 1:
+        page.sort(key=lambda row: (getattr(row, field), row.id), reverse=descending)
+
+    next_cursor = None
+    if len(page) > limit:
+        last = page[limit - 1]
+        next_cursor = encode_cursor(getattr(last, field), last.id)
+    return page[:limit], next_cursor
@@ -0,0 +1,305 @@
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from datetime import date as Date, datetime, time, timedelta
+from decimal import Decimal
+from functools import reduce
+from heapq import merge
+from itertools import groupby
+from operator import itemgetter, or_
+from pathlib import Path
+from zipfile import ZipFile
+import os
+import shutil
+import tempfile
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from .exports import as_querysets
+from .models import Order, OrderItem, MenuItem, Stall, Watermark, ArchivedOrder
+
+WATERMARK_NAME = "parquet_export_updated_at"
+PARTITIONED_TABLES = ("orders", "order_items")
+
+ORDER_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('user_id', pa.int64()),
+    ('created_at', pa.timestamp('us', tz='UTC')),
+    ('status', pa.string()),
+    ('pickup_time', pa.timestamp('us', tz='UTC')),
+    ('total_cost', pa.decimal128(10, 2)),
+    ('transaction_id', pa.string()),
+    ('is_paid', pa.bool_()),
+    ('voucher_id', pa.int64()),
+    ('is_complete', pa.bool_()),
+    ('updated_at', pa.timestamp('us', tz='UTC')),
+])
+
+ORDER_ITEM_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('order_id', pa.int64()),
+    ('item_id', pa.int64()),
+    ('item_name', pa.string()),
+    ('unit_price', pa.decimal128(6, 2)),
+    ('quantity', pa.int64()),
+    ('line_total', pa.decimal128(10, 2)),
+    ('voucher_id', pa.int64()),
+])
+
+MENU_ITEM_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('stall_id', pa.int64()),
+    ('name', pa.string()),
+    ('description', pa.string()),
+    ('price', pa.decimal128(6, 2)),
+    ('category', pa.string()),
+])
+
+STALL_SCHEMA = pa.schema([
+    ('id', pa.int64()),
+    ('name', pa.string()),
+    ('owner_id', pa.int64()),
+    ('average_lead_time', pa.int64()),
+    ('closing_time', pa.time64('us')),
+    ('slot_capacity', pa.int64()),
+])
+
+class ParquetBatchWriter:
+    """Write rows to a Parquet file one row group per chunk_size rows.
+
+    The file is built under a dot-prefixed temp name, which dataset readers
+    skip, and only moved into place once every row was written.
+    """
+
+    def __init__(self, path, schema, chunk_size):
+        self.path = Path(path)
+        self.schema = schema
+        self.chunk_size = chunk_size
+        self.rows = []
+
+    def __enter__(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=self.path.parent, prefix=".", suffix=".tmp")
+        os.close(fd)
+        self.writer = pq.ParquetWriter(self.tmp_path, self.schema)
+        return self
+
+    def append(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        columns = zip(*self.rows)
+        self.writer.write_table(pa.Table.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, self.schema)], schema=self.schema
+        ))
+        self.rows = []
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.flush()
+        self.writer.close()
+        if exc_type is None:
+            os.replace(self.tmp_path, self.path)
+        else:
+            os.unlink(self.tmp_path)
+
+def partition_path(root, table, stall_id, date):
+    return Path(root) / table / f"stall_id={stall_id}" / f"date={date.isoformat()}" / "part-0.parquet"
+
+def write_table(path, schema, rows, chunk_size):
+    with ParquetBatchWriter(path, schema, chunk_size) as writer:
+        for row in rows:
+            writer.append(row)
+
+def write_partitioned(root, table, schema, rows, chunk_size):
+    # Rows arrive sorted by (stall_id, date), so each partition is one contiguous run.
+    written = set()
+    for (stall_id, date), partition in groupby(rows, key=itemgetter(0, 1)):
+        write_table(partition_path(root, table, stall_id, date), schema, (row[2:] for row in partition), chunk_size)
+        written.add((stall_id, date))
+    return written
+
+def remove_partition(root, table, stall_id, date):
+    path = partition_path(root, table, stall_id, date)
+    path.unlink(missing_ok=True)
+    for directory in (path.parent, path.parent.parent):
+        try:
+            directory.rmdir()
+        except OSError:
+            # Not empty, or already gone.
+            break
+
+def changed_partitions(orders):
+    return set(orders.annotate(date=TruncDate('created_at')).values_list('stall_id', 'date').distinct())
+
+def partition_counts(querysets):
+    counts = {}
+    for queryset in querysets:
+        for stall_id, date, orders in (
+            queryset.annotate(date=TruncDate('created_at')).values('stall_id', 'date')
+            .annotate(orders=Count('id')).values_list('stall_id', 'date', 'orders')
+        ):
+            counts[stall_id, date] = counts.get((stall_id, date), 0) + orders
+    return counts
+
+def exported_counts(root):
+    # Footer metadata only; no row groups are read.
+    counts = {}
+    for path in Path(root, "orders").glob("stall_id=*/date=*/part-0.parquet"):
+        stall_id = int(path.parent.parent.name.removeprefix("stall_id="))
+        date = Date.fromisoformat(path.parent.name.removeprefix("date="))
+        counts[stall_id, date] = pq.ParquetFile(path).metadata.num_rows
+    return counts
+
+def in_partitions(rows, partitions):
+    if partitions is None:
+        return rows
+    return (row for row in rows if row[:2] in partitions)
+
+def order_rows(orders, chunk_size):
+    if orders.model is ArchivedOrder:
+        orders = orders.annotate(updated_at=F('archived_at'))
+    return (
+        orders.annotate(date=TruncDate('created_at'))
+        .order_by('stall_id', 'created_at', 'id')
+        .values_list('stall_id', 'date', *ORDER_SCHEMA.names)
+        .iterator(chunk_size=chunk_size)
+    )
+
+def item_rows(orders, chunk_size):
+    if orders.model is ArchivedOrder:
+        # Archived lines keep no ids of their own, only what the receipt shows.
+        archived = (
+            orders.annotate(date=TruncDate('created_at'))
+            .order_by('stall_id', 'date', 'id')
+            .values_list('stall_id', 'date', 'id', 'items')
+            .iterator(chunk_size=chunk_size)
+        )
+        return (
+            (stall_id, date, None, order_id, None, item['item_name'], Decimal(item['unit_price']),
+             item['quantity'], Decimal(item['line_total']), None)
+            for stall_id, date, order_id, items in archived
+            for item in items
+        )
+    return (
+        OrderItem.objects.db_manager(orders.db).filter(order__in=orders.values('id'))
+        .annotate(date=TruncDate('order__created_at'))
+        .order_by('order__stall_id', 'date', 'order_id', 'id')
+        .values_list('order__stall_id', 'date', *ORDER_ITEM_SCHEMA.names)
+        .iterator(chunk_size=chunk_size)
+    )
+
+def write_dataset(root, orders, partitions=None, chunk_size=None):
+    """Write ``orders`` and their items as Parquet partitioned by stall and local date.
+
+    ``orders`` may be a queryset or several with disjoint ids (hot and
+    archived orders). Only the ``(stall_id, date)`` pairs in ``partitions``
+    are rewritten when it is given. Stalls and menu items are small and
+    rewritten every time.
+    """
+    chunk_size = chunk_size or settings.EXPORT_CHUNK_SIZE
+    querysets = as_querysets(orders)
+    db = querysets[0].db
+    stall_ids = reduce(or_, (Q(id__in=queryset.values('stall_id')) for queryset in querysets))
+    if partitions is not None:
+        if not partitions:
+            querysets = [queryset.none() for queryset in querysets]
+        else:
+            first_day = min(date for _, date in partitions)
+            querysets = [
+                queryset.filter(
+                    stall_id__in={stall_id for stall_id, _ in partitions},
+                    created_at__gte=timezone.make_aware(datetime.combine(first_day, time.min)),
+                )
+                for queryset in querysets
+            ]
+
+    # Each source is sorted within its partitions, so merging keeps every
+    # (stall_id, date) run contiguous.
+    orders = merge(*(order_rows(queryset, chunk_size) for queryset in querysets), key=itemgetter(0, 4, 2))
+    items = merge(*(item_rows(queryset, chunk_size) for queryset in querysets), key=itemgetter(0, 1, 3))
+    stalls = Stall.objects.db_manager(db).filter(stall_ids).order_by('id')
+    menu_items = MenuItem.objects.db_manager(db).filter(stall__in=stalls.values('id')).order_by('id')
+    written = {
+        'orders': write_partitioned(root, "orders", ORDER_SCHEMA, in_partitions(orders, partitions), chunk_size),
+        'order_items': write_partitioned(
+            root, "order_items", ORDER_ITEM_SCHEMA, in_partitions(items, partitions), chunk_size
+        ),
+    }
+    for table, tables_written in written.items():
+        # A rewritten partition that no longer has rows must not keep its old file.
+        for stall_id, date in (partitions or set()) - tables_written:
+            remove_partition(root, table, stall_id, date)
+    write_table(
+        Path(root) / "stalls.parquet",
+        STALL_SCHEMA,
+        stalls.values_list(*STALL_SCHEMA.names).iterator(chunk_size=chunk_size),
+        chunk_size,
+    )
+    write_table(
+        Path(root) / "menu_items.parquet",
+        MENU_ITEM_SCHEMA,
+        menu_items.values_list(*MENU_ITEM_SCHEMA.names).iterator(chunk_size=chunk_size),
+        chunk_size,
+    )
+    return {table: len(tables_written) for table, tables_written in written.items()}
+
+def rebuild_dataset(root, querysets, chunk_size=None):
+    """Write the whole dataset into a fresh directory and swap it in for ``root``.
+
+    Nothing left over from earlier exports (deleted orders, emptied
+    partitions) survives, and a failed run leaves the old export untouched.
+    """
+    root = Path(root)
+    root.parent.mkdir(parents=True, exist_ok=True)
+    fresh = Path(tempfile.mkdtemp(dir=root.parent, prefix=f".{root.name}."))
+    try:
+        written = write_dataset(fresh, querysets, chunk_size=chunk_size)
+    except BaseException:
+        shutil.rmtree(fresh)
+        raise
+    if root.exists():
+        old = fresh.with_name(f"{fresh.name}.old")
+        os.replace(root, old)
+        os.replace(fresh, root)
+        shutil.rmtree(old)
+    else:
+        os.replace(fresh, root)
+    return written
+
+def export_parquet(root=None, full=False, chunk_size=None):
+    root = Path(root or settings.PARQUET_EXPORT_ROOT)
+    started = timezone.now()
+    since = None if full else Watermark.objects.get_value(WATERMARK_NAME)
+    querysets = [Order.objects.all(), ArchivedOrder.objects.all()]
+    if not since:
+        written = rebuild_dataset(root, querysets, chunk_size)
+    else:
+        # Writers stamp updated_at before they commit, so re-read a short
+        # window behind the watermark; rewriting a partition is idempotent.
+        since = datetime.fromisoformat(since) - timedelta(seconds=settings.PARQUET_EXPORT_OVERLAP_SECONDS)
+        partitions = changed_partitions(Order.objects.filter(updated_at__gte=since))
+        partitions |= changed_partitions(ArchivedOrder.objects.filter(archived_at__gte=since))
+        # Deletes leave no updated_at behind; catch them by comparing row
+        # counts with what is on disk.
+        counts = partition_counts(querysets)
+        exported = exported_counts(root)
+        partitions |= {partition for partition, orders in counts.items() if exported.get(partition) != orders}
+        for stall_id, date in exported.keys() - counts.keys():
+            for table in PARTITIONED_TABLES:
+                remove_partition(root, table, stall_id, date)
+        written = write_dataset(root, querysets, partitions, chunk_size)
+    Watermark.objects.set_value(WATERMARK_NAME, started.isoformat())
+    return written
+
+def write_dataset_zip(orders, file, chunk_size=None):
+    with tempfile.TemporaryDirectory() as root:
+        write_dataset(root, orders, chunk_size=chunk_size)
+        with ZipFile(file, 'w') as archive:
+            for path in sorted(Path(root).rglob("*.parquet")):
+                archive.write(path, path.relative_to(root))
@@ -0,0 +1,187 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import threading
+import time
+import weakref
+import httpx
+import requests
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+class PayMongoError(Exception):
+    pass
+
+class PayMongoUnavailable(PayMongoError):
+    pass
+
+class CircuitBreaker:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= settings.PAYMONGO_BREAKER_RESET_SECONDS:
+                # Half-open: let this call probe PayMongo and hold the others back.
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= settings.PAYMONGO_BREAKER_THRESHOLD:
+                self.opened_at = time.monotonic()
+
+breaker = CircuitBreaker()
+
+_session = None
+_session_lock = threading.Lock()
+_async_clients = weakref.WeakKeyDictionary()
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            retry = Retry(
+                total=settings.PAYMONGO_MAX_RETRIES,
+                read=0,
+                # Only idempotent methods are resent on these statuses; a
+                # repeated POST could open a second checkout session.
+                status_forcelist=RETRY_STATUSES,
+                backoff_factor=settings.PAYMONGO_RETRY_BACKOFF,
+                raise_on_status=False,
+            )
+            _session.mount("https://", HTTPAdapter(pool_maxsize=settings.PAYMONGO_POOL_SIZE, max_retries=retry))
+            _session.mount("http://", HTTPAdapter(pool_maxsize=settings.PAYMONGO_POOL_SIZE, max_retries=retry))
+        return _session
+
+def get_async_client():
+    # httpx connections belong to the event loop that opened them, so keep one
+    # client per loop. Only used under ASGI, where that loop lives as long as
+    # the process.
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.PAYMONGO_READ_TIMEOUT, connect=settings.PAYMONGO_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=settings.PAYMONGO_POOL_SIZE),
+        )
+        _async_clients[loop] = client
+    return client
+
+def headers():
+    return {
+        "Authorization": f"Basic {settings.PAYMONGO_SECRET_KEY}",
+        "Content-Type": "application/json"
+    }
+
+def checkout_session_payload(transaction_id, amount, description, reference):
+    return {
+        "data": {
+            "attributes": {
+                "description": description,
+                "reference_number": reference,
+                # Copied onto the payment, where webhooks and reconciliation read it.
+                "metadata": {"payment_reference": reference},
+                "line_items": [{
+                    "currency": "PHP",
+                    "amount": int(amount * 100),
+                    "description": description,
+                    "name": transaction_id,
+                    "quantity": 1
+                }],
+                "payment_method_types": ["gcash", "paymaya", "card"],
+                "success_url": f"http://localhost:8000/transaction/{transaction_id}/",
+                "cancel_url": "http://localhost:8000/cart/"
+            }
+        }
+    }
+
+def _checkout_url(status_code, body):
+    if status_code not in [200, 201]:
+        raise PayMongoError(f"PayMongo returned {status_code}")
+    return body["data"]["attributes"]["checkout_url"]
+
+def create_checkout_session(transaction_id, amount, description, reference):
+    if not breaker.allow():
+        raise PayMongoUnavailable("PayMongo circuit is open")
+    try:
+        response = get_session().post(
+            f"{settings.PAYMONGO_API_BASE}/checkout_sessions",
+            json=checkout_session_payload(transaction_id, amount, description, reference),
+            headers=headers(),
+            timeout=(settings.PAYMONGO_CONNECT_TIMEOUT, settings.PAYMONGO_READ_TIMEOUT),
+        )
+        checkout_url = _checkout_url(response.status_code, response.json() if response.ok else None)
+    except (requests.RequestException, ValueError, KeyError, PayMongoError) as exc:
+        breaker.record_failure()
+        raise PayMongoError(str(exc)) from exc
+    breaker.record_success()
+    return checkout_url
+
+def list_payments(after=None, limit=100):
+    if not breaker.allow():
+        raise PayMongoUnavailable("PayMongo circuit is open")
+    params = {"limit": limit}
+    if after:
+        params["after"] = after
+    try:
+        response = get_session().get(
+            f"{settings.PAYMONGO_API_BASE}/payments",
+            params=params,
+            headers=headers(),
+            timeout=(settings.PAYMONGO_CONNECT_TIMEOUT, settings.PAYMONGO_READ_TIMEOUT),
+        )
+        if response.status_code != 200:
+            raise PayMongoError(f"PayMongo returned {response.status_code}")
+        body = response.json()
+    except (requests.RequestException, ValueError, PayMongoError) as exc:
+        breaker.record_failure()
+        raise PayMongoError(str(exc)) from exc
+    breaker.record_success()
+    return body["data"], body.get("has_more", False)
+
+async def acreate_checkout_session(transaction_id, amount, description, reference):
+    if not settings.PAYMONGO_ASYNC_CLIENT:
+        # Under WSGI each async view runs on a throwaway event loop, which would
+        # leave a client with open connections behind per request.
+        return await sync_to_async(create_checkout_session, thread_sensitive=False)(
+            transaction_id, amount, description, reference
+        )
+    if not breaker.allow():
+        raise PayMongoUnavailable("PayMongo circuit is open")
+    client = get_async_client()
+    try:
+        for attempt in range(settings.PAYMONGO_MAX_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(settings.PAYMONGO_RETRY_BACKOFF * 2 ** (attempt - 1))
+            try:
+                response = await client.post(
+                    f"{settings.PAYMONGO_API_BASE}/checkout_sessions",
+                    json=checkout_session_payload(transaction_id, amount, description, reference),
+                    headers=headers(),
+                )
+                break
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                # The request never reached PayMongo, so resending it is safe.
+                if attempt == settings.PAYMONGO_MAX_RETRIES:
+                    raise
+        checkout_url = _checkout_url(response.status_code, response.json() if response.is_success else None)
+    except (httpx.HTTPError, ValueError, KeyError, PayMongoError) as exc:
+        breaker.record_failure()
+        raise PayMongoError(str(exc)) from exc
+    breaker.record_success()
+    return checkout_url
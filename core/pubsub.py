@@ -0,0 +1,142 @@
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+import asyncio
+import threading
+import time
+
+class InProcessSubscription:
+    def __init__(self, broker, topics, timeout):
+        self.broker = broker
+        self.topics = topics
+        self.timeout = timeout
+        self.queue = asyncio.Queue()
+
+    async def __aenter__(self):
+        self.loop = asyncio.get_running_loop()
+        with self.broker.lock:
+            for topic in self.topics:
+                self.broker.subscribers[topic].add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        with self.broker.lock:
+            for topic in self.topics:
+                self.broker.subscribers[topic].discard(self)
+                if not self.broker.subscribers[topic]:
+                    del self.broker.subscribers[topic]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await asyncio.wait_for(self.queue.get(), self.timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class InProcessBroker:
+    """Fan messages out to subscribers living in this process.
+
+    ``publish`` may be called from any thread; each subscriber is an asyncio
+    queue bound to the event loop that entered it. Publishes from other
+    processes (more web workers, process_webhooks) never arrive, so only use
+    it with a single process serving everything.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = defaultdict(set)
+
+    def publish(self, topic, message):
+        with self.lock:
+            subscribers = list(self.subscribers.get(topic, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.loop.call_soon_threadsafe(subscriber.queue.put_nowait, message)
+            except RuntimeError:
+                # The subscriber's loop already closed; its __aexit__ unregisters it.
+                pass
+
+    def subscribe(self, topics, timeout=None):
+        return InProcessSubscription(self, topics, timeout)
+
+class CacheSubscription:
+    def __init__(self, topics, timeout):
+        self.keys = [CacheBroker.key.format(topic=topic) for topic in topics]
+        self.timeout = timeout
+        self.pending = []
+
+    async def __aenter__(self):
+        self.seen = {key: entry[0] for key, entry in (await cache.aget_many(self.keys)).items()}
+        self.idle_since = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self.pending:
+            if self.timeout is not None and time.monotonic() - self.idle_since >= self.timeout:
+                self.idle_since = time.monotonic()
+                return None
+            await asyncio.sleep(settings.PUBSUB_POLL_SECONDS)
+            for key, (sequence, message) in (await cache.aget_many(self.keys)).items():
+                if self.seen.get(key) != sequence:
+                    self.seen[key] = sequence
+                    self.pending.append(message)
+        self.idle_since = time.monotonic()
+        return self.pending.pop(0)
+
+class CacheBroker:
+    """Share the latest message per topic through the cache.
+
+    Works across processes (web workers, management commands) when CACHES
+    points at a shared backend such as Redis; LocMemCache is per process.
+    Subscribers poll every PUBSUB_POLL_SECONDS.
+    """
+
+    key = "pubsub:{topic}"
+
+    def publish(self, topic, message):
+        cache.set(self.key.format(topic=topic), (time.time_ns(), message), settings.PUBSUB_MESSAGE_TIMEOUT)
+
+    def subscribe(self, topics, timeout=None):
+        return CacheSubscription(topics, timeout)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(settings.PUBSUB_BACKEND)()
+        return _broker
+
+def order_topic(order_id):
+    # Keyed by pk: transaction IDs repeat from one day to the next.
+    return f"order:{order_id}"
+
+def stall_topic(stall_id):
+    return f"stall:{stall_id}"
+
+def publish_order(order_id, transaction_id, status, is_paid):
+    get_broker().publish(order_topic(order_id), {
+        "type": "order",
+        "id": order_id,
+        "transaction_id": transaction_id,
+        "status": status,
+        "is_paid": is_paid,
+    })
+
+def publish_stall(stall_id, estimated_minutes):
+    get_broker().publish(stall_topic(stall_id), {
+        "type": "stall",
+        "stall_id": stall_id,
+        "estimated_minutes": estimated_minutes,
+    })
@@ -0,0 +1,196 @@
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.db.models import Prefetch, Q
+from itertools import islice
+from zipfile import ZipFile, ZIP_DEFLATED
+from pathlib import Path
+from reportlab.pdfgen import canvas
+import django
+import hashlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from .models import Order, OrderItem
+
+# Bump when the PDF layout changes so every receipt gets a new address.
+RECEIPT_LAYOUT_VERSION = 1
+
+def receipt_data(order, items):
+    return {
+        'transaction_id': order.transaction_id,
+        'stall': order.stall.name,
+        'pickup_time': order.pickup_time.strftime('%Y-%m-%d %H:%M'),
+        'voucher': [order.voucher.code, str(order.voucher.discount_amount)] if order.voucher else None,
+        'total_cost': str(order.total_cost),
+        'items': [[item.item_name, item.quantity, str(item.line_total)] for item in items],
+    }
+
+def receipt_digest(data):
+    payload = json.dumps([RECEIPT_LAYOUT_VERSION, data], sort_keys=True).encode()
+    return hashlib.sha256(payload).hexdigest()
+
+def receipt_path(order_id, digest):
+    return Path(settings.RECEIPT_ROOT) / str(order_id) / f"{digest}.pdf"
+
+def render_receipt_pdf(data):
+    buffer = io.BytesIO()
+    p = canvas.Canvas(buffer)
+    p.setFont("Helvetica", 12)
+    y = 800
+    p.drawString(100, y, f"Transaction ID: {data['transaction_id']}")
+    y -= 20
+    p.drawString(100, y, f"Stall: {data['stall']}")
+    y -= 20
+    p.drawString(100, y, f"Pickup Time: {data['pickup_time']}")
+    y -= 20
+    if data['voucher']:
+        code, discount = data['voucher']
+        p.drawString(100, y, f"Voucher: {code} - ₱{discount} off")
+        y -= 20
+    p.drawString(100, y, f"Total Cost: ₱{data['total_cost']}")
+    y -= 40
+    for item_name, quantity, line_total in data['items']:
+        p.drawString(100, y, f"{item_name} × {quantity} = ₱{line_total}")
+        y -= 20
+    p.showPage()
+    p.save()
+    return buffer.getvalue()
+
+def write_receipt(path, data):
+    # Runs in pool workers too, so it must not touch the database.
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, 'wb') as tmp:
+        tmp.write(render_receipt_pdf(data))
+    os.replace(tmp_path, path)
+    # Older renders are left for sweep_stale_receipts: a request may be about
+    # to open one.
+    return str(path)
+
+def ensure_receipt(order_id, data, digest):
+    path = receipt_path(order_id, digest)
+    if not path.exists():
+        write_receipt(path, data)
+    return path
+
+def open_receipt(order_id, data, digest):
+    path = ensure_receipt(order_id, data, digest)
+    try:
+        return open(path, 'rb')
+    except FileNotFoundError:
+        # Swept between the existence check and the open.
+        return open(write_receipt(path, data), 'rb')
+
+def sweep_stale_receipts(grace_seconds=None):
+    """Delete all but each order's newest receipt once older than the grace period."""
+    grace_seconds = settings.RECEIPT_STALE_SECONDS if grace_seconds is None else grace_seconds
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for order_dir in Path(settings.RECEIPT_ROOT).glob("*/"):
+        renders = []
+        for path in order_dir.glob("*.pdf"):
+            try:
+                renders.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+        renders.sort()
+        for mtime, path in renders[:-1]:
+            if mtime < cutoff:
+                path.unlink(missing_ok=True)
+                removed += 1
+    return removed
+
+def receipt_jobs(orders):
+    for order in orders:
+        data = receipt_data(order, order.orderitem_set.all())
+        path = receipt_path(order.id, receipt_digest(data))
+        if not path.exists():
+            yield str(path), data
+
+def with_receipt_data(orders):
+    return (
+        orders.select_related('stall', 'voucher')
+        .prefetch_related(Prefetch('orderitem_set', queryset=OrderItem.objects.order_by('id')))
+        .order_by('id')
+    )
+
+def receipt_orders():
+    return with_receipt_data(Order.objects.filter(Q(is_paid=True) | Q(is_complete=True)))
+
+def render_order_receipts(**filters):
+    rendered = 0
+    for path, data in receipt_jobs(receipt_orders().filter(**filters)):
+        write_receipt(path, data)
+        rendered += 1
+    return rendered
+
+def render_missing_receipts(workers=None, chunk_size=None):
+    workers = workers or os.cpu_count()
+    chunk_size = chunk_size or settings.RECEIPT_RENDER_CHUNK_SIZE
+    jobs = receipt_jobs(receipt_orders().iterator(chunk_size=chunk_size))
+    rendered = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        # Feed the pool one chunk at a time so memory stays bounded on large backfills.
+        while batch := list(islice(jobs, chunk_size)):
+            paths, data = zip(*batch)
+            for _ in pool.map(write_receipt, paths, data, chunksize=max(1, len(batch) // (workers * 4))):
+                rendered += 1
+    return rendered
+
+_render_pool = None
+_render_pool_lock = threading.Lock()
+
+def get_render_pool():
+    """The process pool receipt downloads render on, started on first use and kept for the process."""
+    global _render_pool
+    with _render_pool_lock:
+        if _render_pool is None:
+            _render_pool = ProcessPoolExecutor(max_workers=settings.RECEIPT_RENDER_WORKERS, initializer=django.setup)
+        return _render_pool
+
+class ZipChunks:
+    """Write-only sink for ZipFile that hands back what was written since the last drain."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+def receipt_archive(orders, chunk_size=None):
+    """Yield a ZIP of the orders' receipts piece by piece.
+
+    Receipts missing from disk are rendered one chunk at a time on the shared
+    render pool, so memory stays bounded by chunk_size PDFs.
+    """
+    chunk_size = chunk_size or settings.RECEIPT_RENDER_CHUNK_SIZE
+    orders = with_receipt_data(orders).iterator(chunk_size=chunk_size)
+    sink = ZipChunks()
+    with ZipFile(sink, 'w', ZIP_DEFLATED) as archive:
+        while batch := list(islice(orders, chunk_size)):
+            if missing := list(receipt_jobs(batch)):
+                paths, data = zip(*missing)
+                list(get_render_pool().map(write_receipt, paths, data))
+            for order in batch:
+                data = receipt_data(order, order.orderitem_set.all())
+                name = f"receipt_{order.transaction_id}_{order.id}.pdf"
+                with open_receipt(order.id, data, receipt_digest(data)) as receipt:
+                    with archive.open(name, 'w') as entry:
+                        shutil.copyfileobj(receipt, entry)
+                yield sink.drain()
+    yield sink.drain()
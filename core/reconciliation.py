@@ -0,0 +1,48 @@
+from django.db import transaction
+from django.utils import timezone
+from functools import partial
+
+from .models import Order, Watermark
+from .webhooks import match_orders, publish_paid
+from . import paymongo
+
+WATERMARK_NAME = "paymongo_payments"
+
+def reconcile_payments(page_size=100):
+    watermark = int(Watermark.objects.get_value(WATERMARK_NAME, 0))
+    newest = watermark
+    after = None
+    pages = paid_orders = 0
+    while True:
+        payments, has_more = paymongo.list_payments(after=after, limit=page_size)
+        pages += 1
+        # Re-read the watermark's own second: updates are idempotent and a
+        # payment created in that second after the last run would be missed.
+        fresh = [payment for payment in payments if payment["attributes"]["created_at"] >= watermark]
+        matched = match_orders({
+            payment["id"]: payment["attributes"]
+            for payment in fresh
+            if payment["attributes"]["status"] == "paid"
+        })
+        if matched:
+            with transaction.atomic():
+                paid = {
+                    order_id: (transaction_id, status)
+                    for order_id, transaction_id, status in Order.objects.select_for_update().filter(
+                        id__in=[order[0] for order in matched.values()], is_paid=False
+                    ).values_list('id', 'transaction_id', 'status')
+                }
+                Order.objects.filter(id__in=paid).update(is_paid=True, updated_at=timezone.now())
+                if paid:
+                    transaction.on_commit(partial(publish_paid, paid))
+            paid_orders += len(paid)
+        if fresh:
+            newest = max(newest, max(payment["attributes"]["created_at"] for payment in fresh))
+        # Payments are listed newest first, so a page that reaches the
+        # watermark is the last one with anything new.
+        if not has_more or not payments or payments[-1]["attributes"]["created_at"] <= watermark:
+            break
+        after = payments[-1]["id"]
+
+    Watermark.objects.set_value(WATERMARK_NAME, newest)
+    return pages, paid_orders
@@ -0,0 +1,99 @@
+from collections import Counter
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.timezone import now, localtime, make_aware
+from datetime import datetime, timedelta, time as dt_time
+
+from .models import Order, Stall
+from .cache import get_stall_entry, get_queue_depth, adjust_queue_depth
+from . import pubsub
+
+SLOT_MINUTES = 10
+OPENING_TIME = dt_time(9, 0)
+DEFAULT_CLOSING_TIME = dt_time(17, 0)
+BEFORE_OPENING_LEAD_MINUTES = 15
+DAY_SLOTS_KEY = "slots:{stall_id}:{day}:{closing}"
+
+class SlotFull(Exception):
+    pass
+
+def slot_start(dt):
+    dt = localtime(dt)
+    return dt.replace(minute=dt.minute - dt.minute % SLOT_MINUTES, second=0, microsecond=0)
+
+def day_slots(stall, day):
+    closing_time = stall.closing_time or DEFAULT_CLOSING_TIME
+    key = DAY_SLOTS_KEY.format(stall_id=stall.id, day=day.isoformat(), closing=closing_time.strftime("%H%M"))
+    slots = cache.get(key)
+    if slots is None:
+        slots = []
+        slot = make_aware(datetime.combine(day, OPENING_TIME))
+        closing_dt = make_aware(datetime.combine(day, closing_time))
+        while slot < closing_dt:
+            slots.append(slot)
+            slot += timedelta(minutes=SLOT_MINUTES)
+        cache.set(key, slots, 60 * 60 * 24)
+    return slots
+
+def booked_slots(stall, day):
+    day_start = make_aware(datetime.combine(day, dt_time.min))
+    bookings = (
+        Order.objects.filter(stall=stall, pickup_time__gte=day_start, pickup_time__lt=day_start + timedelta(days=1))
+        .exclude(status="Cancelled")
+        .values('pickup_time')
+        .annotate(orders=Count('id'))
+        .values_list('pickup_time', 'orders')
+    )
+    booked = Counter()
+    for pickup_time, orders in bookings:
+        booked[slot_start(pickup_time)] += orders
+    return booked
+
+def reserve_slot(stall, pickup_dt):
+    """Re-check the slot's capacity; call inside the transaction that creates the order."""
+    # Holding the stall row serializes concurrent checkouts for the same stall.
+    stall = Stall.objects.select_for_update().get(pk=stall.pk)
+    start = slot_start(pickup_dt)
+    booked = (
+        Order.objects.filter(stall=stall, pickup_time__gte=start, pickup_time__lt=start + timedelta(minutes=SLOT_MINUTES))
+        .exclude(status="Cancelled")
+        .count()
+    )
+    if booked >= stall.slot_capacity:
+        raise SlotFull(f"The {start.strftime('%H:%M')} pick-up slot is full.")
+
+def opening_datetime(current_time):
+    return current_time.replace(hour=OPENING_TIME.hour, minute=OPENING_TIME.minute, second=0, microsecond=0)
+
+def right_now_pickup(stall, current_time):
+    opening_dt = opening_datetime(current_time)
+    if current_time < opening_dt:
+        return opening_dt + timedelta(minutes=BEFORE_OPENING_LEAD_MINUTES)
+    return current_time + timedelta(minutes=stall.average_lead_time)
+
+def pickup_options(stall, current_time=None):
+    current_time = localtime(current_time or now())
+    right_now_dt = right_now_pickup(stall, current_time)
+    booked = booked_slots(stall, current_time.date())
+    capacity = stall.slot_capacity
+
+    options = []
+    slot_times = {}
+    if current_time >= opening_datetime(current_time) and booked[slot_start(right_now_dt)] < capacity:
+        label = f"Right Now (pick-up at {right_now_dt.strftime('%H:%M')})"
+        options.append((label, label))
+
+    for slot in day_slots(stall, current_time.date()):
+        if slot > right_now_dt and booked[slot] < capacity:
+            label = slot.strftime("%H:%M")
+            options.append((label, label))
+            slot_times[label] = slot
+    return options, slot_times
+
+def estimated_wait_minutes(stall_id):
+    lead_time = get_stall_entry(stall_id)[1]['average_lead_time']
+    return lead_time * get_queue_depth(stall_id)
+
+def adjust_queue(stall_id, delta):
+    adjust_queue_depth(stall_id, delta)
+    pubsub.publish_stall(stall_id, estimated_wait_minutes(stall_id))
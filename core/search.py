@@ -0,0 +1,198 @@
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import cache
+import re
+import threading
+import time
+import textdistance
+
+from .models import MenuItem
+
+SEARCH_VERSION_KEY = "search:version"
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+NAME_WEIGHT = 3
+STALL_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+FUZZY_SCORE = 0.5
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+def trigrams(token):
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def max_edits(token):
+    if len(token) <= 3:
+        return 0
+    if len(token) <= 6:
+        return 1
+    return 2
+
+class MenuSearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.version = None
+        self.entries = {}
+        self.postings = defaultdict(dict)
+        self.token_trigrams = defaultdict(set)
+        self.initials = defaultdict(set)
+        self.item_tokens = {}
+
+    def entry_tokens(self, entry):
+        weights = {}
+        for field, weight in (('stall_name', STALL_WEIGHT), ('description', DESCRIPTION_WEIGHT), ('name', NAME_WEIGHT)):
+            for token in tokenize(entry[field]):
+                weights[token] = max(weights.get(token, 0), weight)
+        return weights
+
+    def add(self, entry):
+        with self.lock:
+            self.remove(entry['id'])
+            weights = self.entry_tokens(entry)
+            self.entries[entry['id']] = entry
+            self.item_tokens[entry['id']] = set(weights)
+            for token, weight in weights.items():
+                if token not in self.postings:
+                    for gram in trigrams(token):
+                        self.token_trigrams[gram].add(token)
+                    self.initials[token[0]].add(token)
+                self.postings[token][entry['id']] = weight
+
+    def remove(self, item_id):
+        with self.lock:
+            self.entries.pop(item_id, None)
+            for token in self.item_tokens.pop(item_id, ()):
+                postings = self.postings[token]
+                postings.pop(item_id, None)
+                if not postings:
+                    del self.postings[token]
+                    for gram in trigrams(token):
+                        self.token_trigrams[gram].discard(token)
+                    self.initials[token[0]].discard(token)
+
+    def rebuild(self, version=None):
+        rows = MenuItem.objects.values_list('id', 'name', 'description', 'price', 'category', 'stall_id', 'stall__name')
+        with self.lock:
+            self.entries = {}
+            self.postings = defaultdict(dict)
+            self.token_trigrams = defaultdict(set)
+            self.initials = defaultdict(set)
+            self.item_tokens = {}
+            for item_id, name, description, price, category, stall_id, stall_name in rows:
+                self.add({
+                    'id': item_id,
+                    'name': name,
+                    'description': description,
+                    'price': price,
+                    'category': category,
+                    'stall_id': stall_id,
+                    'stall_name': stall_name,
+                })
+            self.version = version
+
+    def rename_stall(self, stall_id, stall_name):
+        with self.lock:
+            for entry in [e for e in self.entries.values() if e['stall_id'] == stall_id]:
+                self.add(dict(entry, stall_name=stall_name))
+
+    def match_term(self, term):
+        matches = {term: EXACT_SCORE} if term in self.postings else {}
+        term_grams = trigrams(term)
+        shared = defaultdict(int)
+        for gram in term_grams:
+            for token in self.token_trigrams.get(gram, ()):
+                shared[token] += 1
+        if len(term) == 1:
+            # "^c$" is the only trigram of a one-letter term and no longer
+            # token contains it, so prefix candidates come from the initials.
+            for token in self.initials.get(term, ()):
+                shared[token] += 1
+        edits = max_edits(term)
+        # Each edit destroys at most three trigrams, so anything sharing fewer
+        # cannot be within the edit budget and skips the distance computation.
+        min_shared = len(term_grams) - 3 * edits
+        for token, count in shared.items():
+            if token in matches:
+                continue
+            if token.startswith(term):
+                matches[token] = PREFIX_SCORE
+            elif (edits and count >= min_shared and abs(len(token) - len(term)) <= edits
+                    and textdistance.levenshtein.distance(term, token) <= edits):
+                matches[token] = FUZZY_SCORE
+        return matches
+
+    def search(self, query, limit=20):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self.lock:
+            scores = None
+            for term in terms:
+                term_scores = {}
+                for token, score in self.match_term(term).items():
+                    for item_id, weight in self.postings[token].items():
+                        term_scores[item_id] = max(term_scores.get(item_id, 0), score * weight)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {item_id: scores[item_id] + s for item_id, s in term_scores.items() if item_id in scores}
+                if not scores:
+                    return []
+            ranked = sorted(scores.items(), key=lambda pair: (-pair[1], self.entries[pair[0]]['name']))
+            return [self.entries[item_id] for item_id, _ in ranked[:limit]]
+
+menu_index = MenuSearchIndex()
+
+# The version must be shared between processes for their indexes to follow
+# each other's changes (see CACHE_IS_SHARED). With a per-process cache it
+# expires after MENU_VERSION_TIMEOUT, and re-seeding it from the clock
+# makes every index rebuild.
+def current_version():
+    return cache.get_or_set(SEARCH_VERSION_KEY, time.time_ns, settings.MENU_VERSION_TIMEOUT)
+
+def bump_version():
+    try:
+        return cache.incr(SEARCH_VERSION_KEY)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(SEARCH_VERSION_KEY, version, settings.MENU_VERSION_TIMEOUT)
+        return version
+
+def search_menu(query, limit=20):
+    version = current_version()
+    if menu_index.version != version:
+        menu_index.rebuild(version)
+    return menu_index.search(query, limit)
+
+def _apply_locally(update):
+    # Patch the in-process index only if this bump is the sole change since
+    # the version it holds. If another process bumped in between, the index
+    # lacks that change too, so leave it for the next search to rebuild.
+    with menu_index.lock:
+        previous = menu_index.version
+        version = bump_version()
+        if previous is not None and version == previous + 1:
+            update()
+            menu_index.version = version
+
+def index_menu_item(item):
+    _apply_locally(lambda: menu_index.add({
+        'id': item.id,
+        'name': item.name,
+        'description': item.description,
+        'price': item.price,
+        'category': item.category,
+        'stall_id': item.stall_id,
+        'stall_name': item.stall.name,
+    }))
+
+def unindex_menu_item(item_id):
+    _apply_locally(lambda: menu_index.remove(item_id))
+
+def reindex_stall(stall):
+    _apply_locally(lambda: menu_index.rename_stall(stall.id, stall.name))
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete
+from django.db import transaction
+from django.dispatch import receiver
+
+from .models import Stall, MenuItem, CartItem
+from .cache import bump_menu_version, invalidate_stall_directory, adjust_cart_count
+from .search import index_menu_item, unindex_menu_item, reindex_stall
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def invalidate_menu_on_item_change(sender, instance, **kwargs):
+    bump_menu_version(instance.stall_id)
+
+@receiver([post_save, post_delete], sender=Stall)
+def invalidate_menu_on_stall_change(sender, instance, **kwargs):
+    bump_menu_version(instance.pk)
+    invalidate_stall_directory()
+
+@receiver(post_save, sender=MenuItem)
+def index_item_on_save(sender, instance, **kwargs):
+    index_menu_item(instance)
+
+@receiver(post_delete, sender=MenuItem)
+def unindex_item_on_delete(sender, instance, **kwargs):
+    unindex_menu_item(instance.pk)
+
+@receiver(post_save, sender=Stall)
+def reindex_stall_on_save(sender, instance, **kwargs):
+    reindex_stall(instance)
+
+@receiver(post_save, sender=CartItem)
+def count_cart_item_on_create(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: adjust_cart_count(instance.user_id, 1))
+
+# Also fires for MenuItem cascades, admin deletes and queryset deletes.
+@receiver(post_delete, sender=CartItem)
+def count_cart_item_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: adjust_cart_count(instance.user_id, -1))
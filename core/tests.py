@@ -1 +1,1231 @@
-from django.test import TestCase
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.checks import run_checks
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import patch
+from openpyxl import load_workbook
+from zipfile import ZipFile
+import pyarrow.parquet as pq
+
+from .models import CustomUser, Stall, MenuItem, CartItem, Order, TransactionSequence, OrderItem, WebhookEvent, Notification, ArchivedOrder
+from .webhooks import process_pending_events
+from .reconciliation import reconcile_payments
+from .blacklist import auto_blacklist_users
+from .archive import ARCHIVED_FIELDS, archive_orders
+from .receipts import get_render_pool, receipt_archive, receipt_path, render_missing_receipts, sweep_stale_receipts
+from .exports import order_csv_rows, write_orders_by_day_xlsx
+from .parquet import export_parquet, partition_path, write_dataset
+from .kitchen import mark_ready
+from .search import bump_version, menu_index, search_menu
+from .cart import CachedCart, get_cart
+from .views import allocate_transaction_id
+from .scheduling import SlotFull, pickup_options, reserve_slot
+from .cache import get_cart_count, get_stall_index, get_menu_snapshot, get_menu_version, get_queue_depth, reconcile_queue_depths
+from .notifications import SMSGateway, dispatch_pending
+from .pubsub import InProcessBroker
+from .fake_paymongo import FakePayMongo
+from . import paymongo
+import asyncio
+import csv
+import io
+import tempfile
+import hashlib
+import hmac
+import json
+import os
+
+def create_stall(**options):
+    return Stall.objects.create(name="Komo", **options)
+
+def create_student():
+    return CustomUser.objects.create_user("12345", "Test Student", "09170000000", "test@student.ateneo.edu", "pw")
+
+def create_staff():
+    staff = CustomUser.objects.create_user("kom001", "Komo Staff", "09170000001", "staff@komo.ph", "pw")
+    staff.is_staff = True
+    staff.save()
+    return staff
+
+class HomeViewQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_student()
+        self.stall = create_stall()
+        self.client.force_login(self.user)
+
+    def create_orders(self, count):
+        Order.objects.bulk_create([
+            Order(user=self.user, stall=self.stall, transaction_id=f"T{i:05d}")
+            for i in range(count)
+        ])
+
+    def test_query_count_is_constant_in_order_count(self):
+        self.client.get(reverse('home'))
+        self.create_orders(3)
+        with self.assertNumQueries(3):
+            self.client.get(reverse('home'))
+        self.create_orders(50)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, "Komo")
+
+    def test_stall_directory_invalidated_on_stall_change(self):
+        self.client.get(reverse('home'))
+        self.stall.name = "Komo Renamed"
+        self.stall.save()
+        self.assertContains(self.client.get(reverse('home')), "Komo Renamed")
+
+class MenuSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_student()
+        self.stall = create_stall()
+        self.item = MenuItem.objects.create(stall=self.stall, name="Adobo", price=50, category="Food")
+        MenuItem.objects.create(stall=self.stall, name="Iced Tea", price=30, category="Beverage")
+
+    def test_warm_snapshot_is_served_without_queries(self):
+        get_menu_snapshot(self.stall.id)
+        with self.assertNumQueries(0):
+            menu = get_menu_snapshot(self.stall.id)
+        self.assertEqual([item.name for item in menu['food_items']], ["Adobo"])
+        self.assertEqual([item.name for item in menu['beverage_items']], ["Iced Tea"])
+
+    def test_menu_item_change_bumps_version(self):
+        get_menu_snapshot(self.stall.id)
+        version = get_menu_version(self.stall.id)
+        self.item.price = 75
+        self.item.save()
+        self.assertNotEqual(get_menu_version(self.stall.id), version)
+        self.assertEqual(get_menu_snapshot(self.stall.id)['food_items'][0].price, 75)
+
+        self.item.delete()
+        self.assertEqual(get_menu_snapshot(self.stall.id)['food_items'], [])
+
+    def test_expired_version_picks_up_changes_from_other_processes(self):
+        get_menu_snapshot(self.stall.id)
+        # Another worker's save bumped only its own cache; ours catches up
+        # once the version key expires.
+        MenuItem.objects.filter(pk=self.item.pk).update(price=75)
+        cache.delete(f"menu:version:{self.stall.id}")
+        self.assertEqual(get_menu_snapshot(self.stall.id)['food_items'][0].price, 75)
+
+    @override_settings(CACHE_IS_SHARED=False)
+    def test_deploy_check_warns_about_per_process_cache(self):
+        self.assertEqual([message.id for message in run_checks(include_deployment_checks=True, tags=["caches"])],
+                         ["core.W001"])
+        with self.settings(CACHE_IS_SHARED=True):
+            self.assertEqual(run_checks(include_deployment_checks=True, tags=["caches"]), [])
+
+    def test_stall_change_is_visible_on_menu_page(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('stall_detail', args=[self.stall.id]))
+        self.stall.name = "Komo Renamed"
+        self.stall.save()
+        self.assertContains(self.client.get(reverse('stall_detail', args=[self.stall.id])), "Komo Renamed")
+
+class MenuSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        menu_index.version = None
+        self.komo = Stall.objects.create(name="Komo")
+        self.kiosk = Stall.objects.create(name="Kiosk")
+        self.adobo = MenuItem.objects.create(
+            stall=self.komo, name="Chicken Adobo", description="Braised in soy", price=80, category="Food"
+        )
+        MenuItem.objects.create(stall=self.kiosk, name="Soy Milk", price=35, category="Beverage")
+        MenuItem.objects.create(stall=self.kiosk, name="Calamansi Juice", price=30, category="Beverage")
+
+    def names(self, query):
+        return [entry['name'] for entry in search_menu(query)]
+
+    def test_exact_prefix_and_fuzzy_matches(self):
+        self.assertEqual(self.names("adobo"), ["Chicken Adobo"])
+        self.assertEqual(self.names("chick"), ["Chicken Adobo"])
+        self.assertEqual(self.names("adbo"), ["Chicken Adobo"])
+        self.assertEqual(self.names("chiken adob"), ["Chicken Adobo"])
+        self.assertEqual(self.names("pizza"), [])
+
+    def test_short_terms_match_by_prefix(self):
+        self.assertEqual(self.names("c"), ["Calamansi Juice", "Chicken Adobo"])
+        self.assertEqual(self.names("ca"), ["Calamansi Juice"])
+
+    def test_name_matches_rank_above_description_matches(self):
+        self.assertEqual(self.names("soy"), ["Soy Milk", "Chicken Adobo"])
+        self.assertEqual(self.names("kiosk"), ["Calamansi Juice", "Soy Milk"])
+
+    def test_index_follows_menu_changes(self):
+        self.names("adobo")
+        MenuItem.objects.create(stall=self.komo, name="Pork Sisig", price=90, category="Food")
+        self.assertEqual(self.names("sisig"), ["Pork Sisig"])
+        self.adobo.delete()
+        self.assertEqual(self.names("adobo"), [])
+        self.kiosk.name = "Kape"
+        self.kiosk.save()
+        self.assertEqual(self.names("kape"), ["Calamansi Juice", "Soy Milk"])
+
+    def test_local_change_patches_the_index_without_a_rebuild(self):
+        self.names("adobo")
+        MenuItem.objects.create(stall=self.komo, name="Pork Sisig", price=90, category="Food")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names("sisig"), ["Pork Sisig"])
+
+    def test_change_from_another_process_forces_a_rebuild(self):
+        self.names("adobo")
+        # Another process saves an item and bumps the shared version.
+        MenuItem.objects.bulk_create([MenuItem(stall=self.kiosk, name="Buko Juice", price=40, category="Beverage")])
+        bump_version()
+        MenuItem.objects.create(stall=self.komo, name="Pork Sisig", price=90, category="Food")
+        self.assertEqual(self.names("buko"), ["Buko Juice"])
+        self.assertEqual(self.names("sisig"), ["Pork Sisig"])
+
+@override_settings(PAYMONGO_RETRY_BACKOFF=0, PAYMONGO_BREAKER_THRESHOLD=2)
+class PayMongoClientTests(TestCase):
+    def setUp(self):
+        paymongo.breaker.record_success()
+        self.fake = FakePayMongo().start()
+        self.addCleanup(self.fake.stop)
+        override = override_settings(PAYMONGO_API_BASE=self.fake.url, PAYMONGO_SECRET_KEY="sk_test_fake")
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_creates_checkout_session(self):
+        url = paymongo.create_checkout_session("S01001", 150, "Order from Komo", "ref1")
+        self.assertTrue(url.startswith(self.fake.url))
+        attributes = self.fake.requests[0][1]["data"]["attributes"]
+        line_item = attributes["line_items"][0]
+        self.assertEqual((line_item["name"], line_item["amount"]), ("S01001", 15000))
+        self.assertEqual(attributes["description"], "Order from Komo")
+        self.assertEqual((attributes["reference_number"], attributes["metadata"]), ("ref1", {"payment_reference": "ref1"}))
+
+    def test_checkout_session_post_is_not_resent(self):
+        for create in (paymongo.create_checkout_session, async_to_sync(paymongo.acreate_checkout_session)):
+            with self.subTest(create=create), override_settings(PAYMONGO_ASYNC_CLIENT=True):
+                self.fake.requests.clear()
+                self.fake.fail_statuses = [503]
+                with self.assertRaises(paymongo.PayMongoError):
+                    create("S01001", 150, "Order from Komo", "ref1")
+                self.assertEqual(len(self.fake.requests), 1)
+
+    def test_payment_listing_retries_transient_failures(self):
+        self.fake.fail_statuses = [503]
+        self.fake.add_payment("S01001")
+        payments, has_more = paymongo.list_payments()
+        self.assertEqual(len(payments), 1)
+        self.assertEqual(len(self.fake.requests), 2)
+
+    def test_wsgi_uses_the_pooled_session(self):
+        paymongo._async_clients.clear()
+        url = async_to_sync(paymongo.acreate_checkout_session)("S01001", 150, "Order from Komo", "ref1")
+        self.assertTrue(url.startswith(self.fake.url))
+        self.assertEqual(len(paymongo._async_clients), 0)
+
+    @override_settings(PAYMONGO_READ_TIMEOUT=0.1, PAYMONGO_ASYNC_CLIENT=True)
+    def test_slow_response_times_out(self):
+        self.fake.delay = 0.5
+        with self.assertRaises(paymongo.PayMongoError):
+            async_to_sync(paymongo.acreate_checkout_session)("S01001", 150, "Order from Komo", "ref1")
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.fake.fail_statuses = [400, 400]
+        for _ in range(2):
+            with self.assertRaises(paymongo.PayMongoError):
+                paymongo.create_checkout_session("S01001", 150, "Order from Komo", "ref1")
+        with self.assertRaises(paymongo.PayMongoUnavailable):
+            paymongo.create_checkout_session("S01001", 150, "Order from Komo", "ref1")
+        self.assertEqual(len(self.fake.requests), 2)
+
+@override_settings(CART_BACKEND="core.cart.CachedCart")
+class CachedCartTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_student()
+        self.stall = create_stall()
+        self.adobo = MenuItem.objects.create(stall=self.stall, name="Adobo", price=50, category="Food")
+        self.tea = MenuItem.objects.create(stall=self.stall, name="Iced Tea", price=30, category="Beverage")
+        self.client.force_login(self.user)
+
+    def quantities(self):
+        return {line.item_id: line.quantity for line in get_cart(self.user).lines()}
+
+    def test_views_route_through_configured_backend(self):
+        self.assertIsInstance(get_cart(self.user), CachedCart)
+        self.client.post(reverse('add_to_cart', args=[self.adobo.id]))
+        self.client.post(reverse('update_quantity', args=[self.adobo.id]), {"action": "increase"})
+        response = self.client.get(reverse('view_cart'))
+        self.assertContains(response, "Adobo")
+        self.assertEqual(self.quantities(), {self.adobo.id: 2})
+
+    def test_reads_are_cached_and_writes_go_through(self):
+        cart = get_cart(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add(self.adobo)
+        self.assertEqual(CartItem.objects.get(user=self.user, item=self.adobo).quantity, 1)
+        cart.lines()
+        with self.assertNumQueries(0):
+            lines = cart.lines()
+        self.assertEqual([(line.item.name, line.stall.name, line.subtotal()) for line in lines], [("Adobo", "Komo", 50)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.apply({self.adobo.id: 2, self.tea.id: 1}, {self.adobo.id: self.stall.id, self.tea.id: self.stall.id})
+        self.assertEqual(
+            dict(CartItem.objects.filter(user=self.user).values_list('item_id', 'quantity')),
+            {self.adobo.id: 3, self.tea.id: 1},
+        )
+        self.assertEqual(self.quantities(), {self.adobo.id: 3, self.tea.id: 1})
+
+    def test_lines_follow_menu_changes(self):
+        cart = get_cart(self.user)
+        cart.add(self.adobo)
+        cart.lines()
+        self.adobo.price = 60
+        self.adobo.save()
+        self.assertEqual([line.subtotal() for line in cart.lines()], [60])
+
+    def test_reloads_from_rows_after_cache_miss(self):
+        get_cart(self.user).add(self.adobo, 2)
+        self.quantities()
+        cache.clear()
+        self.assertEqual(self.quantities(), {self.adobo.id: 2})
+
+class CartApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_student()
+        self.stall = create_stall()
+        self.adobo = MenuItem.objects.create(stall=self.stall, name="Adobo", price=50, category="Food")
+        self.tea = MenuItem.objects.create(stall=self.stall, name="Iced Tea", price=30, category="Beverage")
+
+    def post(self, operations):
+        return self.client.post(reverse('cart_api'), json.dumps({"operations": operations}), content_type="application/json")
+
+    def test_anonymous_client_gets_json_401(self):
+        response = self.post([{"item_id": self.adobo.id, "delta": 1}])
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {"error": "Authentication required."})
+
+    def test_applies_batch_and_clamps_at_zero(self):
+        self.client.force_login(self.user)
+        response = self.post([
+            {"item_id": self.adobo.id, "delta": 1},
+            {"item_id": self.adobo.id, "delta": 1},
+            {"item_id": self.tea.id, "delta": 2},
+        ])
+        self.assertEqual(response.json()["count"], 4)
+        self.assertEqual(response.json()["stall_totals"], {str(self.stall.id): "160.00"})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post([{"item_id": self.adobo.id, "delta": -5}, {"item_id": self.tea.id, "delta": -1}])
+        cart_sql = [q['sql'] for q in queries if '"core_cartitem"' in q['sql']]
+        # Quantities change in SQL; rows are only read to delete emptied lines and to summarize.
+        self.assertEqual([sql.split()[0] for sql in cart_sql[:2]], ["UPDATE", "UPDATE"])
+        self.assertIn('"quantity" = MAX(("core_cartitem"."quantity" + -5), 0)', cart_sql[0])
+        self.assertEqual(
+            dict(CartItem.objects.filter(user=self.user).values_list('item_id', 'quantity')), {self.tea.id: 1}
+        )
+        self.assertEqual(response.json()["items"], [
+            {"item_id": self.tea.id, "stall_id": self.stall.id, "quantity": 1, "subtotal": "30.00"},
+        ])
+
+    def test_rejects_unknown_items_without_changes(self):
+        self.client.force_login(self.user)
+        response = self.post([{"item_id": self.adobo.id, "delta": 1}, {"item_id": 999, "delta": 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(CartItem.objects.exists())
+
+class CartCountTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_student()
+        self.stall = create_stall()
+        self.adobo = MenuItem.objects.create(stall=self.stall, name="Adobo", price=50, category="Food")
+        self.tea = MenuItem.objects.create(stall=self.stall, name="Iced Tea", price=30, category="Beverage")
+
+    def test_counter_follows_cart_and_cascade_changes(self):
+        self.assertEqual(get_cart_count(self.user.pk), 0)
+        cart = get_cart(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            cart.add(self.adobo)
+            cart.add(self.adobo)
+            cart.add(self.tea)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart_count(self.user.pk), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tea.delete()
+        self.assertEqual(get_cart_count(self.user.pk), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            CartItem.objects.get(user=self.user).delete()
+        self.assertEqual(get_cart_count(self.user.pk), 0)
+
+    @override_settings(CART_COUNT_TIMEOUT=0)
+    def test_counter_expires(self):
+        get_cart_count(self.user.pk)
+        CartItem.objects.bulk_create([CartItem(user=self.user, stall=self.stall, item=self.adobo)])
+        self.assertEqual(get_cart_count(self.user.pk), 1)
+
+class TransactionSequenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.komo = Stall.objects.create(name="Komo")
+        self.kiosk = Stall.objects.create(name="Kiosk")
+
+    def test_numbers_are_sequential_per_stall_and_restart_daily(self):
+        today = timezone.localdate()
+        self.assertEqual([TransactionSequence.objects.next_number(self.komo, today) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(TransactionSequence.objects.next_number(self.kiosk, today), 1)
+        self.assertEqual(TransactionSequence.objects.next_number(self.komo, today + timedelta(days=1)), 1)
+        self.assertEqual(TransactionSequence.objects.next_number(self.komo, today), 4)
+
+    def test_ids_use_stall_position_and_refresh_the_directory(self):
+        self.assertEqual(allocate_transaction_id(self.kiosk), "S02001")
+        # Created behind the cached directory's back, as another process would.
+        Stall.objects.bulk_create([Stall(name="Kape")])
+        self.assertEqual(allocate_transaction_id(Stall.objects.get(name="Kape")), "S03001")
+        with self.assertRaises(Stall.DoesNotExist):
+            get_stall_index(999)
+
+class PickupOptionsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_student()
+        self.stall = create_stall(slot_capacity=1, closing_time=time(11, 0))
+        self.morning = timezone.make_aware(datetime(2026, 1, 5, 8, 0))
+
+    def book(self, hour, minute):
+        return Order.objects.create(
+            user=self.user, stall=self.stall, total_cost=100, transaction_id="S01001",
+            pickup_time=timezone.make_aware(datetime(2026, 1, 5, hour, minute)),
+        )
+
+    def test_full_slots_are_hidden(self):
+        self.book(10, 5)
+        cancelled = self.book(10, 20)
+        cancelled.status = "Cancelled"
+        cancelled.save()
+        options, slot_times = pickup_options(self.stall, self.morning)
+        self.assertNotIn("10:00", slot_times)
+        self.assertIn("10:10", slot_times)
+        self.assertIn("10:20", slot_times)
+
+    def test_slots_stop_at_closing_time(self):
+        options, slot_times = pickup_options(self.stall, self.morning)
+        self.assertEqual(min(slot_times), "09:20")
+        self.assertEqual(max(slot_times), "10:50")
+
+    def test_reserve_slot_rechecks_capacity(self):
+        reserve_slot(self.stall, timezone.make_aware(datetime(2026, 1, 5, 10, 0)))
+        self.book(10, 0)
+        with self.assertRaises(SlotFull):
+            reserve_slot(self.stall, timezone.make_aware(datetime(2026, 1, 5, 10, 9)))
+
+class CheckoutViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        paymongo.breaker.record_success()
+        self.fake = FakePayMongo().start()
+        self.addCleanup(self.fake.stop)
+        override = override_settings(PAYMONGO_API_BASE=self.fake.url, PAYMONGO_SECRET_KEY="sk_test_fake")
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = create_student()
+        self.stall = create_stall()
+        self.item = MenuItem.objects.create(stall=self.stall, name="Rice Bowl", price=120, category="Food")
+        self.client.force_login(self.user)
+        self.client.post(reverse('add_to_cart', args=[self.item.id]))
+
+    def test_checkout_creates_order_and_redirects_to_payment(self):
+        form = self.client.get(reverse('checkout', args=[self.stall.id])).context['form']
+        pickup_time = form.fields['pickup_time'].choices[0][0]
+        response = self.client.post(reverse('checkout', args=[self.stall.id]), {'pickup_time': pickup_time})
+        self.assertTrue(response['Location'].startswith(self.fake.url))
+        order = Order.objects.get(user=self.user)
+        self.assertEqual(order.transaction_id, "S01001")
+        attributes = self.fake.requests[0][1]["data"]["attributes"]
+        self.assertEqual(attributes["description"], "Order from Komo")
+        self.assertEqual(attributes["metadata"], {"payment_reference": order.payment_reference})
+        order_item = OrderItem.objects.get(order=order)
+        self.assertEqual((order_item.item_name, order_item.unit_price, order_item.line_total), ("Rice Bowl", 120, 120))
+
+    def test_order_items_keep_their_price_after_menu_changes(self):
+        form = self.client.get(reverse('checkout', args=[self.stall.id])).context['form']
+        pickup_time = form.fields['pickup_time'].choices[0][0]
+        self.client.post(reverse('checkout', args=[self.stall.id]), {'pickup_time': pickup_time})
+        self.item.price = 200
+        self.item.save()
+        response = self.client.get(reverse('transaction_summary', args=["S01001"]))
+        self.assertContains(response, "1 × Rice Bowl — ₱120.00")
+
+    def test_checkout_refuses_a_slot_filled_after_the_form_was_shown(self):
+        self.stall.slot_capacity = 1
+        self.stall.save()
+        form = self.client.get(reverse('checkout', args=[self.stall.id])).context['form']
+        pickup_time = form.fields['pickup_time'].choices[0][0]
+        if pickup_time.startswith("Right Now"):
+            pickup_dt = timezone.now() + timedelta(minutes=self.stall.average_lead_time)
+        else:
+            hour, minute = map(int, pickup_time.split(":"))
+            pickup_dt = timezone.localtime().replace(hour=hour, minute=minute)
+        other = CustomUser.objects.create_user("67890", "Other Student", "09170000001", "other@student.ateneo.edu", "pw")
+        create_session = paymongo.acreate_checkout_session
+
+        async def competing_checkout(*args):
+            # Another student takes the last spot while this checkout talks to PayMongo.
+            await Order.objects.acreate(
+                user=other, stall=self.stall, total_cost=100, transaction_id="S01999", pickup_time=pickup_dt
+            )
+            return await create_session(*args)
+
+        with patch.object(paymongo, 'acreate_checkout_session', competing_checkout):
+            response = self.client.post(reverse('checkout', args=[self.stall.id]), {'pickup_time': pickup_time})
+        self.assertRedirects(response, reverse('checkout', args=[self.stall.id]), fetch_redirect_response=False)
+        self.assertFalse(Order.objects.filter(user=self.user).exists())
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 1)
+
+class WebhookInboxTests(TestCase):
+    def setUp(self):
+        self.user = create_student()
+        self.stall = create_stall()
+
+    def post_event(self, event_id, reference, **attributes):
+        attributes = {"description": "Order from Komo", "metadata": {"payment_reference": reference}, **attributes}
+        payload = json.dumps({
+            "data": {
+                "id": event_id,
+                "attributes": {"type": "payment.paid", "data": {"attributes": attributes}},
+            }
+        }).encode()
+        signature = hmac.new(settings.PAYMONGO_WEBHOOK_SECRET.encode(), payload, hashlib.sha256).hexdigest()
+        return self.client.post(
+            reverse('paymongo_webhook'), payload, content_type="application/json", HTTP_PAYMONGO_SIGNATURE=signature
+        )
+
+    def test_events_are_stored_once_and_applied_in_batch(self):
+        order = Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01001", payment_reference="ref1")
+        self.assertEqual(self.post_event("evt_1", "ref1").status_code, 200)
+        self.assertEqual(self.post_event("evt_1", "ref1").status_code, 200)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+        order.refresh_from_db()
+        self.assertFalse(order.is_paid)
+
+        self.assertEqual(process_pending_events(), 1)
+        order.refresh_from_db()
+        self.assertTrue(order.is_paid)
+        self.assertEqual(WebhookEvent.objects.get().status, "Processed")
+
+    def test_event_pays_only_the_order_with_its_reference(self):
+        yesterday = Order.objects.create(
+            user=self.user, stall=self.stall, transaction_id="S01001", payment_reference="ref1",
+            created_at=timezone.now() - timedelta(days=1), is_paid=True,
+        )
+        today = Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01001", payment_reference="ref2")
+        Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01002", payment_reference="ref3")
+        self.post_event("evt_1", "ref2")
+        with tempfile.TemporaryDirectory() as receipt_root, self.settings(RECEIPT_ROOT=receipt_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                process_pending_events()
+            self.assertEqual([path.name for path in Path(receipt_root).iterdir()], [str(today.pk)])
+        self.assertEqual(list(Order.objects.filter(is_paid=True).order_by('id')), [yesterday, today])
+
+    def test_session_from_before_references_matches_by_transaction_id_and_date(self):
+        Order.objects.create(
+            user=self.user, stall=self.stall, transaction_id="S01001", created_at=timezone.now() - timedelta(days=1),
+        )
+        today = Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01001")
+        self.post_event("evt_1", None, description="S01001", created_at=int(timezone.now().timestamp()))
+        with patch('core.webhooks.publish_paid') as publish_paid, self.captureOnCommitCallbacks(execute=True):
+            process_pending_events()
+        publish_paid.assert_called_once_with({today.id: ("S01001", "Pending")})
+        self.assertEqual(list(Order.objects.filter(is_paid=True)), [today])
+        self.assertEqual(WebhookEvent.objects.get().status, "Processed")
+
+    def test_event_for_missing_order_is_retried_then_dead_lettered(self):
+        self.post_event("evt_2", "S09999")
+        process_pending_events()
+        event = WebhookEvent.objects.get()
+        self.assertEqual((event.status, event.attempts), ("Pending", 1))
+        self.assertEqual(process_pending_events(), 0)
+
+        with self.settings(WEBHOOK_MAX_ATTEMPTS=2):
+            WebhookEvent.objects.update(next_attempt_at=event.received_at)
+            process_pending_events()
+        self.assertEqual(WebhookEvent.objects.get().status, "Dead")
+
+    def test_rejects_bad_signature(self):
+        response = self.client.post(reverse('paymongo_webhook'), b"{}", content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+
+class ReconcilePaymentsTests(TestCase):
+    def setUp(self):
+        paymongo.breaker.record_success()
+        self.fake = FakePayMongo().start()
+        self.addCleanup(self.fake.stop)
+        override = override_settings(PAYMONGO_API_BASE=self.fake.url, PAYMONGO_SECRET_KEY="sk_test_fake")
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = create_student()
+        self.stall = create_stall()
+
+    def test_pages_through_payments_since_watermark(self):
+        Order.objects.bulk_create([
+            Order(user=self.user, stall=self.stall, transaction_id=f"S01{i:03d}", payment_reference=f"ref{i}")
+            for i in range(1, 6)
+        ])
+        for i in range(1, 5):
+            self.fake.add_payment("Order from Komo", created_at=1000 + i, reference=f"ref{i}")
+        self.fake.add_payment("Order from Komo", status="failed", created_at=1005, reference="ref5")
+
+        self.assertEqual(reconcile_payments(page_size=2), (3, 4))
+        self.assertEqual(Order.objects.filter(is_paid=True).count(), 4)
+
+        self.fake.add_payment("Order from Komo", created_at=2000, reference="ref5")
+        self.fake.requests.clear()
+        self.assertEqual(reconcile_payments(page_size=2), (1, 1))
+        self.assertEqual(len(self.fake.requests), 1)
+        self.assertTrue(Order.objects.get(transaction_id="S01005").is_paid)
+
+    def test_old_payment_does_not_pay_an_order_that_reused_its_id(self):
+        Order.objects.create(
+            user=self.user, stall=self.stall, transaction_id="S01001", payment_reference="ref1", is_paid=True,
+            created_at=timezone.now() - timedelta(days=1),
+        )
+        today = Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01001", payment_reference="ref2")
+        self.fake.add_payment("Order from Komo", created_at=1000, reference="ref1")
+        self.assertEqual(reconcile_payments(), (1, 0))
+        today.refresh_from_db()
+        self.assertFalse(today.is_paid)
+
+    def test_payment_without_reference_matches_by_transaction_id_and_date(self):
+        order = Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01001")
+        self.fake.add_payment("S01001", created_at=int(order.created_at.timestamp()))
+        self.assertEqual(reconcile_payments(), (1, 1))
+
+    def test_reconciled_orders_are_published_like_webhook_payments(self):
+        order = Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01001", payment_reference="ref1")
+        self.fake.add_payment("Order from Komo", reference="ref1")
+        with self.captureOnCommitCallbacks(execute=True), patch('core.reconciliation.publish_paid') as publish_paid:
+            reconcile_payments()
+            reconcile_payments()
+        publish_paid.assert_called_once_with({order.id: ("S01001", "Pending")})
+
+class AutoBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stall = create_stall()
+        self.users = [
+            CustomUser.objects.create_user(f"1000{i}", f"Student {i}", "09170000000", f"s{i}@student.ateneo.edu", "pw")
+            for i in range(3)
+        ]
+
+    def create_order(self, user, minutes_ago, is_paid=False):
+        return Order.objects.create(
+            user=user, stall=self.stall, is_paid=is_paid, created_at=timezone.now() - timedelta(minutes=minutes_ago)
+        )
+
+    def test_blacklists_unpaid_users_once_past_grace_period(self):
+        unpaid, paid, recent = self.users
+        self.create_order(unpaid, 60)
+        self.create_order(unpaid, 45)
+        self.create_order(paid, 60, is_paid=True)
+        self.create_order(recent, 1)
+
+        self.assertEqual(auto_blacklist_users(), 1)
+        self.assertEqual(
+            list(CustomUser.objects.filter(blacklisted=True).values_list('student_id', flat=True)), [unpaid.student_id]
+        )
+        self.assertEqual(auto_blacklist_users(), 0)
+
+    def test_middleware_blocks_blacklisted_users(self):
+        user = self.users[0]
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+        user.blacklisted = True
+        user.save()
+        response = self.client.get(reverse('view_cart'))
+        self.assertContains(response, "blacklisted", status_code=403)
+        self.assertEqual(self.client.post(reverse('logout')).status_code, 302)
+
+    def test_command_blacklisting_applies_to_the_next_request(self):
+        user = self.users[0]
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+        self.create_order(user, 60)
+        call_command('blacklist_unpaid', stdout=io.StringIO())
+        self.assertContains(self.client.get(reverse('home')), "blacklisted", status_code=403)
+
+class FailingSMSGateway(SMSGateway):
+    def send(self, recipient, body):
+        raise ConnectionError("gateway down")
+
+class UnreachableSMSGateway(SMSGateway):
+    def open(self):
+        raise ConnectionError("gateway down")
+
+    def send(self, recipient, body):
+        pass
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        self.stall = create_stall()
+        self.staff = create_staff()
+        self.user = create_student()
+        self.order = Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01001")
+
+    def test_mark_ready_queues_notifications_for_dispatch(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('mark_order_ready', args=["S01001"]))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).status, "Ready")
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('channel', 'status')), [("Email", "Pending"), ("SMS", "Pending")]
+        )
+
+        with self.assertLogs('core.notifications', "INFO") as logs:
+            results = dispatch_pending()
+        self.assertEqual((results["Email"][:2], results["SMS"][:2]), ((1, 0), (1, 0)))
+        self.assertIn("SMS to 09170000000", logs.output[0])
+        self.assertEqual(mail.outbox[0].to, ["test@student.ateneo.edu"])
+        self.assertFalse(Notification.objects.exclude(status="Sent").exists())
+
+    @override_settings(SMS_GATEWAY="core.tests.FailingSMSGateway", NOTIFICATION_MAX_ATTEMPTS=2)
+    def test_failed_sends_are_retried_then_marked_failed(self):
+        Notification.objects.create(user=self.user, order=self.order, channel="SMS", recipient="09170000000", body="Hi")
+        self.assertEqual(dispatch_pending()["SMS"][:2], (0, 1))
+        notification = Notification.objects.get()
+        self.assertEqual((notification.status, notification.attempts), ("Pending", 1))
+        self.assertEqual(dispatch_pending()["SMS"][:2], (0, 0))
+
+        Notification.objects.update(next_attempt_at=timezone.now())
+        dispatch_pending()
+        self.assertEqual(Notification.objects.get().status, "Failed")
+
+    @override_settings(SMS_GATEWAY="core.tests.UnreachableSMSGateway")
+    def test_channel_that_cannot_open_does_not_stop_the_others(self):
+        Notification.objects.bulk_create([
+            Notification(user=self.user, order=self.order, channel="SMS", recipient="09170000000", body="Hi"),
+            Notification(user=self.user, order=self.order, channel="Email", recipient=self.user.email, body="Hi"),
+        ])
+        with self.assertLogs('core.notifications', "ERROR"):
+            results = dispatch_pending()
+        self.assertEqual((results["Email"][:2], results["SMS"][:2]), ((1, 0), (0, 1)))
+        sms = Notification.objects.get(channel="SMS")
+        self.assertEqual((sms.status, sms.attempts, sms.last_error), ("Pending", 1, "ConnectionError('gateway down')"))
+
+class OrderEventsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stall = create_stall()
+        self.staff = create_staff()
+        self.user = create_student()
+        self.order = Order.objects.create(user=self.user, stall=self.stall, transaction_id="S01001")
+
+    def test_broker_delivers_messages_published_from_other_threads(self):
+        broker = InProcessBroker()
+
+        async def receive():
+            async with broker.subscribe(["order:S01001"], timeout=0.05) as messages:
+                await sync_to_async(broker.publish, thread_sensitive=False)("order:S01001", {"status": "Ready"})
+                return [await anext(messages), await anext(messages)]
+
+        self.assertEqual(async_to_sync(receive)(), [{"status": "Ready"}, None])
+        self.assertEqual(dict(broker.subscribers), {})
+
+    def mark_ready(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('mark_order_ready', args=["S01001"]))
+
+    def test_stream_pushes_status_when_order_is_marked_ready(self):
+        async def stream():
+            await self.async_client.aforce_login(self.user)
+            response = await self.async_client.get(reverse('order_events', args=[self.order.id]))
+            chunks = aiter(response.streaming_content)
+            events = [await anext(chunks)]
+            await sync_to_async(self.mark_ready)()
+            events += [chunk async for chunk in chunks]
+            return [json.loads(event.decode().removeprefix("data: ")) for event in events]
+
+        self.client.force_login(self.staff)
+        events = async_to_sync(stream)()
+        self.assertEqual(events[0]["status"], "Pending")
+        self.assertEqual(events[0]["estimated_minutes"], 15)
+        self.assertEqual(events[-2]["estimated_minutes"], 0)
+        self.assertEqual((events[-1]["id"], events[-1]["status"]), (self.order.id, "Ready"))
+
+    def test_wsgi_declines_the_stream_and_serves_a_snapshot_to_poll(self):
+        self.client.force_login(self.user)
+        url = reverse('order_events', args=[self.order.id])
+        self.assertEqual(self.client.get(url).status_code, 204)
+        snapshot = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual((snapshot["status"], snapshot["estimated_minutes"]), ("Pending", 15))
+
+class QueueDepthTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stall = create_stall(average_lead_time=5)
+        self.staff = create_staff()
+        self.user = create_student()
+        Order.objects.bulk_create([
+            Order(user=self.user, stall=self.stall, transaction_id=f"S01{i:03d}") for i in range(1, 4)
+        ])
+
+    def test_summary_reads_eta_from_counter(self):
+        self.assertEqual(get_queue_depth(self.stall.id), 3)
+        self.client.force_login(self.staff)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse('mark_order_ready', args=["S01001"]))
+            self.client.get(reverse('mark_order_ready', args=["S01001"]))
+        self.assertEqual(get_queue_depth(self.stall.id), 2)
+
+        self.client.force_login(self.user)
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('transaction_summary', args=["S01002"]))
+        self.assertEqual(response.context['estimated_minutes'], 10)
+
+    def test_reconcile_corrects_drift(self):
+        get_queue_depth(self.stall.id)
+        Order.objects.filter(transaction_id="S01003").update(status="Cancelled")
+        self.assertEqual(reconcile_queue_depths(), {self.stall.id: 2})
+        self.assertEqual(get_queue_depth(self.stall.id), 2)
+        self.assertEqual(reconcile_queue_depths(), {})
+
+    def test_per_process_counter_is_recounted_after_its_timeout(self):
+        get_queue_depth(self.stall.id)
+        Order.objects.filter(transaction_id="S01003").update(status="Ready")
+        self.assertEqual(get_queue_depth(self.stall.id), 3)
+        with patch('time.time', return_value=timezone.now().timestamp() + settings.QUEUE_DEPTH_TIMEOUT + 1):
+            self.assertEqual(get_queue_depth(self.stall.id), 2)
+
+class KitchenQueueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = CustomUser.objects.create_user("kom001", "Komo Owner", "09170000001", "owner@komo.ph", "pw")
+        self.stall = create_stall(owner=self.owner)
+        self.user = create_student()
+        pickup = timezone.now()
+        self.orders = Order.objects.bulk_create([
+            Order(user=self.user, stall=self.stall, transaction_id=f"S01{i:03d}", pickup_time=pickup + timedelta(minutes=i // 2))
+            for i in range(5)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, item_name="Adobo", quantity=2) for order in self.orders
+        ])
+
+    def test_pages_through_queue_by_pickup_time(self):
+        self.client.force_login(self.owner)
+        self.client.get(reverse('home'))
+        with self.settings(KITCHEN_PAGE_SIZE=2):
+            seen = []
+            cursor = ""
+            while True:
+                with self.assertNumQueries(5):
+                    response = self.client.get(reverse('kitchen', args=[self.stall.id]), {"after": cursor} if cursor else {})
+                seen += [order.transaction_id for order in response.context['orders']]
+                cursor = response.context['next_cursor']
+                if not cursor:
+                    break
+        self.assertEqual(seen, [f"S01{i:03d}" for i in range(5)])
+        self.assertContains(response, "2 × Adobo")
+
+    def test_ready_and_complete_actions(self):
+        order = self.orders[0]
+        self.client.force_login(self.owner)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('kitchen_order_action', args=[order.id, "ready"]))
+        self.assertEqual(response.json(), {"id": order.id, "status": "Ready", "is_complete": False})
+        self.assertEqual(get_queue_depth(self.stall.id), 4)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse('kitchen_order_action', args=[order.id, "complete"]))
+        self.assertTrue(response.json()["is_complete"])
+        self.assertEqual(callbacks, [])
+        response = self.client.get(reverse('kitchen', args=[self.stall.id]))
+        self.assertNotIn(order, response.context['orders'])
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('kitchen_order_action', args=[self.orders[1].id, "ready"]))
+        self.assertEqual(response.status_code, 403)
+
+    def test_repeated_ready_click_notifies_once(self):
+        order = self.orders[0]
+        self.client.force_login(self.owner)
+        for published in (1, 0):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                response = self.client.post(reverse('kitchen_order_action', args=[order.id, "ready"]))
+            self.assertEqual(response.json()["status"], "Ready")
+            self.assertEqual(len(callbacks), published)
+        self.assertEqual(Notification.objects.filter(order=order).count(), 2)
+        self.assertEqual(get_queue_depth(self.stall.id), 4)
+
+    def test_cancelled_order_is_not_readied_or_completed(self):
+        order = self.orders[0]
+        Order.objects.filter(pk=order.pk).update(status="Cancelled")
+        self.client.force_login(self.owner)
+        for action in ("ready", "complete"):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                response = self.client.post(reverse('kitchen_order_action', args=[order.id, action]))
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(callbacks, [])
+        order.refresh_from_db()
+        self.assertEqual((order.status, order.is_complete), ("Cancelled", False))
+        self.assertFalse(Notification.objects.exists())
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stall = create_stall()
+        self.user = create_student()
+        created_at = timezone.now()
+        Order.objects.bulk_create([
+            Order(user=self.user, stall=self.stall, transaction_id=f"S01{i:03d}", created_at=created_at - timedelta(days=i // 2))
+            for i in range(5)
+        ])
+        self.client.force_login(self.user)
+        self.client.get(reverse('home'))
+
+    def test_pages_newest_first_with_constant_queries(self):
+        seen = []
+        cursor = None
+        with self.settings(ORDER_HISTORY_PAGE_SIZE=2):
+            while True:
+                with self.assertNumQueries(4):
+                    response = self.client.get(reverse('order_history'), {"after": cursor} if cursor else {})
+                seen += [order.transaction_id for order in response.context['orders']]
+                cursor = response.context['next_cursor']
+                if not cursor:
+                    break
+        self.assertEqual(seen, ["S01001", "S01000", "S01003", "S01002", "S01004"])
+
+    def test_json_variant_and_my_orders_redirect(self):
+        with self.settings(ORDER_HISTORY_PAGE_SIZE=3):
+            data = self.client.get(reverse('order_history'), {"format": "json"}).json()
+            self.assertEqual([order["stall"] for order in data["orders"]], ["Komo"] * 3)
+            response = self.client.get(reverse('my_orders'), {"format": "json", "after": data["next"]}, follow=True)
+        self.assertEqual([order["transaction_id"] for order in response.json()["orders"]], ["S01002", "S01004"])
+        self.assertIsNone(response.json()["next"])
+
+class ArchiveOrdersTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.stall = create_stall()
+        self.user = create_student()
+        old = timezone.now() - timedelta(days=200)
+        self.orders = Order.objects.bulk_create([
+            Order(user=self.user, stall=self.stall, transaction_id="S01001", created_at=old, is_paid=True, is_complete=True),
+            Order(user=self.user, stall=self.stall, transaction_id="S01002", created_at=old + timedelta(hours=1), is_paid=True, is_complete=True),
+            Order(user=self.user, stall=self.stall, transaction_id="S01003", created_at=old, is_paid=False),
+            Order(user=self.user, stall=self.stall, transaction_id="S02001", is_paid=True, is_complete=True),
+        ])
+        OrderItem.objects.create(order=self.orders[0], item_name="Adobo", unit_price=50, quantity=2, line_total=100)
+
+    def test_moves_old_completed_paid_orders_in_chunks(self):
+        self.assertEqual(archive_orders(chunk_size=1), 2)
+        self.assertEqual(
+            sorted(Order.objects.values_list('transaction_id', flat=True)), ["S01003", "S02001"]
+        )
+        archived = ArchivedOrder.objects.get(transaction_id="S01001")
+        self.assertEqual(archived.id, self.orders[0].id)
+        self.assertEqual(archived.items, [{"item_name": "Adobo", "unit_price": "50.00", "quantity": 2, "line_total": "100.00"}])
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertEqual(archive_orders(), 0)
+
+    def test_conflicting_archive_row_keeps_the_order_and_archives_the_rest(self):
+        ArchivedOrder.objects.create(
+            id=self.orders[0].id, user=self.user, stall=self.stall, created_at=timezone.now(),
+            status="Ready", pickup_time=timezone.now(), total_cost=0, transaction_id="S09999",
+        )
+        with self.assertLogs('core.archive', 'WARNING'):
+            self.assertEqual(archive_orders(chunk_size=1), 1)
+        self.assertTrue(Order.objects.filter(id=self.orders[0].id).exists())
+        self.assertEqual(OrderItem.objects.count(), 1)
+        self.assertEqual(ArchivedOrder.objects.get(transaction_id="S01002").id, self.orders[1].id)
+
+    def test_identical_archive_row_only_removes_the_order(self):
+        archive_orders()
+        archived = ArchivedOrder.objects.get(id=self.orders[1].id)
+        order = Order(**{field: getattr(archived, field) for field in ARCHIVED_FIELDS})
+        order.save(force_insert=True)
+        self.assertEqual(archive_orders(), 1)
+        self.assertFalse(Order.objects.filter(id=order.id).exists())
+        self.assertEqual(ArchivedOrder.objects.filter(transaction_id="S01002").count(), 1)
+
+    def test_select_all_exports_include_archived_orders(self):
+        archive_orders()
+        admin = CustomUser.objects.create_superuser("admin1", "Admin", "09170000002", "admin@komo.ph", "pw")
+        self.client.force_login(admin)
+        response = self.client.post(reverse('jsecadmin:core_order_changelist'), {
+            "action": "export_orders_with_items_as_csv",
+            "select_across": "1",
+            "_selected_action": [self.orders[2].pk],
+        })
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(
+            [(row[5], row[7]) for row in rows[1:]],
+            [("S01001", "Adobo"), ("S01002", ""), ("S01003", ""), ("S02001", "")],
+        )
+
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        write_dataset(export_root.name, [Order.objects.all(), ArchivedOrder.objects.all()])
+        orders = pq.read_table(Path(export_root.name) / "orders")
+        self.assertEqual(sorted(orders.column("transaction_id").to_pylist()), ["S01001", "S01002", "S01003", "S02001"])
+        items = pq.read_table(Path(export_root.name) / "order_items")
+        self.assertEqual(items.column("item_name").to_pylist(), ["Adobo"])
+
+    def test_select_all_exports_apply_changelist_filters_to_archived_orders(self):
+        other = Stall.objects.create(name="Kitchen")
+        Order.objects.create(
+            user=self.user, stall=other, transaction_id="K01001", is_paid=True, is_complete=True,
+            created_at=timezone.now() - timedelta(days=200),
+        )
+        archive_orders()
+        admin = CustomUser.objects.create_superuser("admin1", "Admin", "09170000002", "admin@komo.ph", "pw")
+        self.client.force_login(admin)
+        changelist = reverse('jsecadmin:core_order_changelist')
+        for query, expected in (
+            (f"stall__id__exact={self.stall.id}", ["S01001", "S01002", "S01003", "S02001"]),
+            ("is_paid__exact=0", ["S01003"]),
+            ("q=S0100", ["S01001", "S01002", "S01003"]),
+        ):
+            with self.subTest(query=query):
+                response = self.client.post(f"{changelist}?{query}", {
+                    "action": "export_orders_as_csv",
+                    "select_across": "1",
+                    "_selected_action": [self.orders[2].pk],
+                })
+                rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+                self.assertEqual(sorted(row[5] for row in rows[1:]), expected)
+
+    def test_history_reads_hot_and_archived_orders(self):
+        archive_orders()
+        self.client.force_login(self.user)
+        with self.settings(ORDER_HISTORY_PAGE_SIZE=2):
+            first = self.client.get(reverse('order_history'), {"format": "json"}).json()
+            second = self.client.get(reverse('order_history'), {"format": "json", "after": first["next"]}).json()
+        self.assertEqual(
+            [order["transaction_id"] for order in first["orders"] + second["orders"]],
+            ["S02001", "S01002", "S01003", "S01001"],
+        )
+
+class ReceiptCacheTests(TestCase):
+    def setUp(self):
+        receipt_root = tempfile.TemporaryDirectory()
+        self.addCleanup(receipt_root.cleanup)
+        override = override_settings(RECEIPT_ROOT=receipt_root.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.root = Path(receipt_root.name)
+        self.stall = create_stall()
+        self.user = create_student()
+        self.orders = Order.objects.bulk_create([
+            Order(user=self.user, stall=self.stall, transaction_id=f"S01{i:03d}", is_paid=i < 3, total_cost=100)
+            for i in range(4)
+        ])
+        OrderItem.objects.create(order=self.orders[0], item_name="Adobo", unit_price=50, quantity=2, line_total=100)
+
+    def test_serves_cached_receipt_with_etag(self):
+        self.client.force_login(self.user)
+        url = reverse('download_receipt', args=["S01000"])
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertTrue(b"".join(response.streaming_content).startswith(b"%PDF"))
+        etag = response["ETag"]
+        self.assertEqual(len(list(self.root.glob("*/*.pdf"))), 1)
+
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        Order.objects.filter(pk=self.orders[0].pk).update(total_cost=90)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        response.close()
+        self.assertEqual(len(list(self.root.glob("*/*.pdf"))), 2)
+        self.assertEqual(sweep_stale_receipts(), 0)
+        os.utime(receipt_path(self.orders[0].pk, etag.strip('"')), (0, 0))
+        self.assertEqual(sweep_stale_receipts(), 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.assertEqual(len(list(self.root.glob("*/*.pdf"))), 1)
+
+    def test_admin_streams_zip_of_receipts(self):
+        admin = CustomUser.objects.create_superuser("admin1", "Admin", "09170000002", "admin@komo.ph", "pw")
+        self.client.force_login(admin)
+        render_missing_receipts(workers=1)
+        response = self.client.post(reverse('jsecadmin:core_order_changelist'), {
+            "action": "download_receipts_zip",
+            "_selected_action": [order.pk for order in self.orders],
+        })
+        self.assertEqual(response["Content-Type"], "application/zip")
+        with ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+            names = archive.namelist()
+            self.assertTrue(archive.read(names[0]).startswith(b"%PDF"))
+        self.assertEqual(names, [f"receipt_S01{i:03d}_{order.pk}.pdf" for i, order in enumerate(self.orders)])
+
+    def test_zip_renders_missing_receipts_on_the_shared_pool(self):
+        render_missing_receipts(workers=1)
+        [cached] = self.root.glob(f"{self.orders[0].pk}/*.pdf")
+        cached_mtime = cached.stat().st_mtime_ns
+        orders = Order.objects.filter(pk__in=[self.orders[0].pk, self.orders[3].pk])
+        with ZipFile(io.BytesIO(b"".join(receipt_archive(orders)))) as archive:
+            self.assertEqual(archive.read(f"receipt_S01000_{self.orders[0].pk}.pdf"), cached.read_bytes())
+            self.assertTrue(archive.read(f"receipt_S01003_{self.orders[3].pk}.pdf").startswith(b"%PDF"))
+        self.assertEqual(cached.stat().st_mtime_ns, cached_mtime)
+        self.assertEqual(len(list(self.root.glob(f"{self.orders[3].pk}/*.pdf"))), 1)
+        self.assertIs(get_render_pool(), get_render_pool())
+
+    def test_backfill_renders_missing_receipts_in_worker_processes(self):
+        self.assertEqual(render_missing_receipts(workers=2, chunk_size=2), 3)
+        self.assertEqual(len(list(self.root.glob("*/*.pdf"))), 3)
+        self.assertEqual(render_missing_receipts(workers=2), 0)
+
+class OrderCsvExportTests(TestCase):
+    def setUp(self):
+        self.admin = CustomUser.objects.create_superuser("admin1", "Admin", "09170000002", "admin@komo.ph", "pw")
+        self.stall = create_stall()
+        self.user = create_student()
+        self.orders = Order.objects.bulk_create([
+            Order(user=self.user, stall=self.stall, transaction_id=f"S01{i:03d}") for i in range(3)
+        ])
+        OrderItem.objects.bulk_create([
+            OrderItem(order=self.orders[0], item_name="Adobo", unit_price=50, quantity=2, line_total=100),
+            OrderItem(order=self.orders[0], item_name="Rice", unit_price=15, quantity=1, line_total=15),
+            OrderItem(order=self.orders[2], item_name="Tea", unit_price=30, quantity=1, line_total=30),
+        ])
+        self.client.force_login(self.admin)
+
+    def export(self, action):
+        response = self.client.post(reverse('jsecadmin:core_order_changelist'), {
+            "action": action,
+            "_selected_action": [order.pk for order in self.orders],
+        })
+        return list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+
+    def test_streams_orders_with_fixed_query_count(self):
+        Order.objects.bulk_create([Order(user=self.user, stall=self.stall) for _ in range(20)])
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(order_csv_rows(Order.objects.all()))
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(rows), 24)
+        self.assertEqual(self.export("export_orders_as_csv")[1][1:3], [str(self.user), "Komo"])
+
+    def test_flattens_items_in_two_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(order_csv_rows(Order.objects.all(), include_items=True))
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(
+            [(row[5], row[7]) for row in rows[1:]],
+            [("S01000", "Adobo"), ("S01000", "Rice"), ("S01001", ""), ("S01002", "Tea")],
+        )
+        self.assertEqual(self.export("export_orders_with_items_as_csv"), [[str(value) for value in row] for row in rows])
+
+    def test_excel_export_splits_sheets_by_pickup_date(self):
+        Order.objects.filter(pk=self.orders[1].pk).update(pickup_time=timezone.now() - timedelta(days=1))
+        with CaptureQueriesContext(connection) as queries:
+            write_orders_by_day_xlsx(Order.objects.all(), io.BytesIO())
+        self.assertEqual(len(queries), 1)
+
+        response = self.client.post(reverse('jsecadmin:core_order_changelist'), {
+            "action": "export_orders_by_day_excel",
+            "_selected_action": [order.pk for order in self.orders],
+        })
+        workbook = load_workbook(io.BytesIO(b"".join(response.streaming_content)), read_only=True)
+        first_day, second_day = workbook.worksheets
+        self.assertEqual(next(first_day.iter_rows(max_row=1, values_only=True))[0], "Order ID")
+        self.assertEqual(
+            [row[1:3] + row[5:6] for row in first_day.iter_rows(min_row=2, values_only=True)],
+            [(str(self.user), "Komo", "S01001")],
+        )
+        self.assertEqual([row[5] for row in second_day.iter_rows(min_row=2, values_only=True)], ["S01000", "S01002"])
+
+@override_settings(PARQUET_EXPORT_OVERLAP_SECONDS=0)
+class ParquetExportTests(TestCase):
+    def setUp(self):
+        export_root = tempfile.TemporaryDirectory()
+        self.addCleanup(export_root.cleanup)
+        self.root = Path(export_root.name)
+        self.admin = CustomUser.objects.create_superuser("admin1", "Admin", "09170000002", "admin@komo.ph", "pw")
+        self.user = create_student()
+        self.komo = Stall.objects.create(name="Komo")
+        self.kiosk = Stall.objects.create(name="Kiosk")
+        MenuItem.objects.create(stall=self.komo, name="Adobo", price=50, category="Food")
+        now = timezone.now()
+        self.today = Order.objects.create(user=self.user, stall=self.komo, transaction_id="S01000", created_at=now)
+        self.yesterday = Order.objects.create(
+            user=self.user, stall=self.komo, transaction_id="S01001", created_at=now - timedelta(days=1)
+        )
+        self.other_stall = Order.objects.create(user=self.user, stall=self.kiosk, transaction_id="S02000", created_at=now)
+        OrderItem.objects.create(order=self.today, item_name="Adobo", unit_price=50, quantity=2, line_total=100)
+        OrderItem.objects.create(order=self.other_stall, item_name="Tea", unit_price=30, quantity=1, line_total=30)
+
+    def path(self, table, order):
+        return partition_path(self.root, table, order.stall_id, timezone.localdate(order.created_at))
+
+    def test_writes_dataset_in_one_query_per_table(self):
+        with CaptureQueriesContext(connection) as queries:
+            written = write_dataset(self.root, Order.objects.all())
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(written, {"orders": 3, "order_items": 2})
+        self.assertEqual(sorted(pq.read_table(self.root / "orders").column("transaction_id").to_pylist()),
+                         ["S01000", "S01001", "S02000"])
+        self.assertEqual(pq.read_table(self.path("order_items", self.today)).column("line_total").to_pylist(),
+                         [Decimal("100.00")])
+        self.assertEqual(pq.read_table(self.root / "menu_items.parquet").column("name").to_pylist(), ["Adobo"])
+
+    def test_incremental_run_rewrites_only_changed_partitions(self):
+        self.assertEqual(export_parquet(self.root), {"orders": 3, "order_items": 2})
+        self.assertEqual(export_parquet(self.root), {"orders": 0, "order_items": 0})
+
+        mark_ready(self.today)
+        self.assertEqual(export_parquet(self.root), {"orders": 1, "order_items": 1})
+        self.assertEqual(pq.read_table(self.path("orders", self.today)).column("status").to_pylist(), ["Ready"])
+        self.assertEqual(pq.read_table(self.path("orders", self.yesterday)).column("status").to_pylist(), ["Pending"])
+        self.assertEqual(export_parquet(self.root, full=True), {"orders": 3, "order_items": 2})
+
+    def test_incremental_run_drops_deleted_orders_and_keeps_archived_ones(self):
+        export_parquet(self.root)
+        self.yesterday.delete()
+        Order.objects.filter(pk=self.today.pk).update(is_paid=True, is_complete=True)
+        archive_orders(older_than_days=0)
+        self.assertEqual(export_parquet(self.root), {"orders": 1, "order_items": 1})
+        self.assertFalse(self.path("orders", self.yesterday).parent.exists())
+        self.assertEqual(pq.read_table(self.path("orders", self.today)).column("transaction_id").to_pylist(), ["S01000"])
+        self.assertEqual(pq.read_table(self.path("order_items", self.today)).column("line_total").to_pylist(),
+                         [Decimal("100.00")])
+
+    def test_admin_item_delete_empties_the_items_partition(self):
+        export_parquet(self.root)
+        self.client.force_login(self.admin)
+        self.client.post(reverse('jsecadmin:core_orderitem_delete', args=[self.today.orderitem_set.get().pk]), {"post": "yes"})
+        self.assertEqual(export_parquet(self.root), {"orders": 1, "order_items": 0})
+        self.assertFalse(self.path("order_items", self.today).exists())
+
+    def test_full_rebuild_replaces_the_export(self):
+        export_parquet(self.root)
+        stray = partition_path(self.root, "orders", 99, timezone.localdate())
+        stray.parent.mkdir(parents=True)
+        stray.touch()
+        self.assertEqual(export_parquet(self.root, full=True), {"orders": 3, "order_items": 2})
+        self.assertFalse(stray.exists())
+        self.assertEqual(sorted(path.name for path in self.root.parent.glob(f".{self.root.name}.*")), [])
+
+    def test_admin_action_zips_selected_partitions(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('jsecadmin:core_order_changelist'), {
+            "action": "export_orders_as_parquet",
+            "_selected_action": [self.today.pk, self.other_stall.pk],
+        })
+        names = ZipFile(io.BytesIO(b"".join(response.streaming_content))).namelist()
+        self.assertEqual(sorted(names), sorted([
+            str(self.path(table, order).relative_to(self.root))
+            for table in ("orders", "order_items") for order in (self.today, self.other_stall)
+        ] + ["menu_items.parquet", "stalls.parquet"]))
@@ -1,10 +1,12 @@
 from django.urls import path
 from django.contrib.auth.views import LogoutView
+from django.views.generic import RedirectView
 from .views import (
-    signup_view, StudentLoginView, home_view, stall_detail_view,
-    add_to_cart, view_cart, update_quantity, checkout_view,
-    transaction_summary, download_receipt, mark_order_ready,
-    test_logout_template, my_orders_view, order_history_view
+    signup_view, StudentLoginView, home_view, stall_detail_view, search_view,
+    add_to_cart, view_cart, update_quantity, cart_api, checkout_view,
+    transaction_summary, download_receipt, mark_order_ready, order_events,
+    kitchen_view, kitchen_order_action,
+    test_logout_template, order_history_view, paymongo_webhook
 )
 
 urlpatterns = [
@@ -13,14 +15,20 @@ urlpatterns = [
     path('logout/', LogoutView.as_view(next_page='login'), name='logout'),
     path('', home_view, name='home'),
     path('stall/<int:stall_id>/', stall_detail_view, name='stall_detail'),
+    path('search/', search_view, name='search'),
     path('add-to-cart/<int:item_id>/', add_to_cart, name='add_to_cart'),
     path('cart/', view_cart, name='view_cart'),
     path('update-quantity/<int:item_id>/', update_quantity, name='update_quantity'),
+    path('api/cart/', cart_api, name='cart_api'),
     path('checkout/<int:stall_id>/', checkout_view, name='checkout'),
     path('transaction/<str:transaction_id>/', transaction_summary, name='transaction_summary'),
+    path('orders/<int:order_id>/events/', order_events, name='order_events'),
     path('download-receipt/<str:transaction_id>/', download_receipt, name='download_receipt'),
     path('mark-ready/<str:transaction_id>/', mark_order_ready, name='mark_order_ready'),
+    path('kitchen/<int:stall_id>/', kitchen_view, name='kitchen'),
+    path('kitchen/orders/<int:order_id>/<str:action>/', kitchen_order_action, name='kitchen_order_action'),
     path('test-logout/', test_logout_template, name='test_logout'),
-    path('my-orders/', my_orders_view, name='my_orders'),
+    path('my-orders/', RedirectView.as_view(pattern_name='order_history', query_string=True, permanent=True), name='my_orders'),
     path('order-history/', order_history_view, name='order_history'),
+    path('webhooks/paymongo/', paymongo_webhook, name='paymongo_webhook'),
 ]
\ No newline at end of file
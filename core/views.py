@@ -4,25 +4,36 @@ from django.contrib.auth.views import LoginView
 from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpResponse, Http404, JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, Http404, JsonResponse, StreamingHttpResponse, FileResponse
 from django.conf import settings
-from django.core.mail import send_mail
 from django.contrib import messages
-from django.utils.timezone import now, make_aware, localtime, localdate
+from django.utils.timezone import now, localtime, localdate
 from django.utils.crypto import get_random_string
+from django.utils.cache import get_conditional_response
+from django.db import transaction
+from asgiref.sync import sync_to_async
 
 from .forms import SignUpForm, CheckoutForm
-from .models import CustomUser, Stall, Order, MenuItem, CartItem, OrderItem, Voucher
+from .models import CustomUser, Stall, Order, MenuItem, OrderItem, Voucher, TransactionSequence, WebhookEvent, ArchivedOrder
+from .cache import get_menu_snapshot, get_stall_directory, get_stall_index
+from .search import search_menu
+from .cart import get_cart, summarize
+from .scheduling import pickup_options as get_pickup_options, estimated_wait_minutes, adjust_queue, reserve_slot, SlotFull
+from .kitchen import kitchen_queue, mark_ready, mark_complete
+from .pagination import keyset_page
+from .receipts import receipt_data, receipt_digest, open_receipt
+from . import paymongo, pubsub
 
-from reportlab.pdfgen import canvas
 from collections import defaultdict
-from datetime import datetime, timedelta, time as dt_time
-import pytz
-import requests
-import io
+from datetime import timedelta
 import json
 import hmac
 import hashlib
+import uuid
+
+CART_API_MAX_OPERATIONS = 100
+FINAL_ORDER_STATUSES = ("Ready", "Cancelled")
 
 class StudentLoginView(LoginView):
     template_name = 'core/login.html'
@@ -41,48 +52,45 @@ def signup_view(request):
 @login_required
 def home_view(request):
     user = request.user
-    if user.blacklisted:
-        unpaid_orders = Order.objects.filter(user=user, is_paid=False)
-        return render(request, 'core/blacklisted.html', {'orders': unpaid_orders})
-    stalls = Stall.objects.all()
-    pending_orders = Order.objects.filter(user=user, is_complete=False).order_by('-created_at')
-    order_history = Order.objects.filter(user=user).order_by('-created_at')
+    pending_orders = (
+        Order.objects.filter(user=user, is_complete=False)
+        .select_related('stall')
+        .order_by('-created_at')[:settings.HOME_PENDING_ORDERS_LIMIT]
+    )
     return render(request, 'core/home.html', {
         'user': user,
-        'stalls': stalls,
-        'orders': order_history,
+        'stalls': get_stall_directory(),
         'pending_orders': pending_orders,
     })
 
 @login_required
 def stall_detail_view(request, stall_id):
-    stall = Stall.objects.get(id=stall_id)
-    food_items = MenuItem.objects.filter(stall=stall, category='Food')
-    beverage_items = MenuItem.objects.filter(stall=stall, category='Beverage')
+    menu = get_menu_snapshot(stall_id)
     return render(request, 'core/stall_detail.html', {
-        'stall': stall,
-        'food_items': food_items,
-        'beverage_items': beverage_items,
+        'stall': menu['stall'],
+        'food_items': menu['food_items'],
+        'beverage_items': menu['beverage_items'],
+    })
+
+@login_required
+def search_view(request):
+    query = request.GET.get('q', '').strip()
+    results = search_menu(query) if query else []
+    return render(request, 'core/search.html', {
+        'query': query,
+        'results': results,
     })
 
 @login_required
 def add_to_cart(request, item_id):
     item = get_object_or_404(MenuItem, id=item_id)
-    cart_item, created = CartItem.objects.get_or_create(
-        user=request.user,
-        item=item,
-        stall=item.stall,
-        defaults={'quantity': 1}
-    )
-    if not created:
-        cart_item.quantity += 1
-        cart_item.save()
+    get_cart(request.user).add(item)
     messages.success(request, f"{item.name} added to cart!")
-    return redirect('stall_detail', stall_id=item.stall.id)
+    return redirect('stall_detail', stall_id=item.stall_id)
 
 @login_required
 def view_cart(request):
-    cart_items = CartItem.objects.filter(user=request.user).select_related('stall', 'item')
+    cart_items = get_cart(request.user).lines()
     grouped_cart = defaultdict(list)
     total_per_stall = {}
     for item in cart_items:
@@ -97,70 +105,77 @@ def view_cart(request):
 @login_required
 def update_quantity(request, item_id):
     action = request.POST.get("action")
-    cart_item = CartItem.objects.get(id=item_id, user=request.user)
+    cart = get_cart(request.user)
     if action == "increase":
-        cart_item.quantity += 1
-    elif action == "decrease" and cart_item.quantity > 1:
-        cart_item.quantity -= 1
+        cart.change(item_id, 1)
+    elif action == "decrease":
+        cart.change(item_id, -1)
     elif action == "remove":
-        cart_item.delete()
-        return redirect('view_cart')
-    cart_item.save()
+        cart.remove(item_id)
     return redirect('view_cart')
 
+@require_POST
+def cart_api(request):
+    if not request.user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
+    deltas = defaultdict(int)
+    try:
+        operations = json.loads(request.body)["operations"]
+        if len(operations) > CART_API_MAX_OPERATIONS:
+            return JsonResponse({"error": "Too many operations."}, status=400)
+        for operation in operations:
+            deltas[int(operation["item_id"])] += int(operation["delta"])
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"error": "Invalid cart operations."}, status=400)
+    stall_ids = dict(MenuItem.objects.filter(id__in=deltas).values_list('id', 'stall_id'))
+    if len(stall_ids) != len(deltas):
+        return JsonResponse({"error": "Unknown menu item."}, status=400)
+    cart = get_cart(request.user)
+    cart.apply(dict(deltas), stall_ids)
+    return JsonResponse(summarize(cart.lines()))
+
 @login_required
 def transaction_summary(request, transaction_id):
     try:
-        order = Order.objects.get(transaction_id=transaction_id, user=request.user)
+        order = Order.objects.select_related('stall').get(transaction_id=transaction_id, user=request.user)
         order_items = OrderItem.objects.filter(order=order)
     except Order.DoesNotExist:
         raise Http404("Transaction not found.")
-    pending_count = Order.objects.filter(stall=order.stall, status='Pending').count()
-    estimated_minutes = 10 * pending_count
+    estimated_minutes = estimated_wait_minutes(order.stall_id)
     return render(request, 'core/transaction_summary.html', {
         'order': order,
-        'order_items': order_items,
+        'items': order_items,
         'estimated_minutes': estimated_minutes,
     })
 
 @login_required
 def download_receipt(request, transaction_id):
     try:
-        order = Order.objects.get(transaction_id=transaction_id, user=request.user)
-        order_items = OrderItem.objects.filter(order=order)
+        order = Order.objects.select_related('stall', 'voucher').get(transaction_id=transaction_id, user=request.user)
     except Order.DoesNotExist:
         raise Http404("Transaction not found.")
-    buffer = io.BytesIO()
-    p = canvas.Canvas(buffer)
-    p.setFont("Helvetica", 12)
-    y = 800
-    p.drawString(100, y, f"Transaction ID: {order.transaction_id}")
-    y -= 20
-    p.drawString(100, y, f"Stall: {order.stall.name}")
-    y -= 20
-    p.drawString(100, y, f"Pickup Time: {order.pickup_time.strftime('%Y-%m-%d %H:%M')}")
-    y -= 20
-    if order.voucher:
-        p.drawString(100, y, f"Voucher: {order.voucher.code} - ₱{order.voucher.discount_amount} off")
-        y -= 20
-    p.drawString(100, y, f"Total Cost: ₱{order.total_cost}")
-    y -= 40
-    for item in order_items:
-        p.drawString(100, y, f"{item.item.name} × {item.quantity} = ₱{item.item.price * item.quantity}")
-        y -= 20
-    p.showPage()
-    p.save()
-    buffer.seek(0)
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="receipt_{order.transaction_id}.pdf"'
+    data = receipt_data(order, OrderItem.objects.filter(order=order).order_by('id'))
+    digest = receipt_digest(data)
+    etag = f'"{digest}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+    response = FileResponse(
+        open_receipt(order.id, data, digest),
+        as_attachment=True,
+        filename=f"receipt_{order.transaction_id}.pdf",
+        content_type='application/pdf',
+    )
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
     return response
 
-@login_required
-def checkout_view(request, stall_id):
+def prepare_checkout(request, stall_id):
     stall = Stall.objects.get(id=stall_id)
-    cart_items = CartItem.objects.filter(user=request.user, stall=stall)
+    cart = get_cart(request.user)
+    cart_items = cart.lines(stall.id)
     if not cart_items:
-        return redirect('view_cart')
+        return None
 
     discount = 0
     voucher_code = request.GET.get('voucher', '')
@@ -175,123 +190,191 @@ def checkout_view(request, stall_id):
     total = sum(item.subtotal() for item in cart_items) - discount
     total = max(total, 0)
 
-    manila_tz = pytz.timezone("Asia/Manila")
-    current_time = now().astimezone(manila_tz)
-    opening_time = current_time.replace(hour=9, minute=0, second=0, microsecond=0)
-    right_now_dt = opening_time + timedelta(minutes=15) if current_time < opening_time else current_time + timedelta(minutes=stall.average_lead_time)
-
-    pickup_options = []
-    if current_time >= opening_time:
-        label = f"Right Now (pick-up at {right_now_dt.strftime('%H:%M')})"
-        pickup_options.append((label, label))
-
-    minute = right_now_dt.minute
-    next_10 = ((minute // 10) + 1) * 10
-    if next_10 == 60:
-        right_now_dt += timedelta(hours=1)
-        next_10 = 0
-    rounded_start = right_now_dt.replace(minute=next_10, second=0, microsecond=0)
-
-    closing_time = stall.closing_time or dt_time(17, 0)
-    closing_dt = make_aware(datetime.combine(current_time.date(), closing_time))
-
-    while rounded_start < closing_dt:
-        label = rounded_start.strftime("%H:%M")
-        pickup_options.append((label, label))
-        rounded_start += timedelta(minutes=10)
+    pickup_options, slot_times = get_pickup_options(stall)
 
     if request.method == 'POST':
         form = CheckoutForm(request.POST, pickup_options=pickup_options)
-        if form.is_valid():
-            pickup_time_str = form.cleaned_data['pickup_time']
-            if pickup_time_str.startswith("Right Now"):
-                pickup_dt = now() + timedelta(minutes=stall.average_lead_time)
-            else:
-                today = now().date()
-                pickup_dt = datetime.combine(today, datetime.strptime(pickup_time_str, "%H:%M").time())
-            today = localdate()
-            existing_orders = Order.objects.filter(stall=stall, created_at__date=today)
-            stall_index = list(Stall.objects.order_by('id').values_list('id', flat=True)).index(stall.id) + 1
-            transaction_number = existing_orders.count() + 1
-            transaction_id = f"S{stall_index:02d}{transaction_number:03d}"
-
-            headers = {
-                "Authorization": f"Basic {settings.PAYMONGO_SECRET_KEY}",
-                "Content-Type": "application/json"
-            }
-            data = {
-                "data": {
-                    "attributes": {
-                        "line_items": [{
-                            "currency": "PHP",
-                            "amount": int(total * 100),
-                            "description": f"Order from {stall.name}",
-                            "name": transaction_id,
-                            "quantity": 1
-                        }],
-                        "payment_method_types": ["gcash", "paymaya", "card"],
-                        "success_url": f"http://localhost:8000/transaction/{transaction_id}/",
-                        "cancel_url": "http://localhost:8000/cart/"
-                    }
-                }
-            }
-
-            response = requests.post("https://api.paymongo.com/v1/checkout_sessions", json=data, headers=headers)
-            if response.status_code not in [200, 201]:
-                messages.error(request, "Failed to create payment session. Please try again later.")
-                return redirect('view_cart')
-
-            checkout_url = response.json()["data"]["attributes"]["checkout_url"]
-
-            order = Order.objects.create(
-                user=request.user,
-                stall=stall,
-                pickup_time=pickup_dt,
-                total_cost=total,
-                transaction_id=transaction_id,
-                status="Pending",
-                voucher=voucher
-            )
-
-            for cart_item in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    item=cart_item.item,
-                    quantity=cart_item.quantity
-                )
-
-            cart_items.delete()
-            return redirect(checkout_url)
+        form.is_valid()
     else:
         form = CheckoutForm(pickup_options=pickup_options)
 
-    return render(request, 'core/checkout.html', {
+    return {
         'stall': stall,
+        'cart': cart,
         'cart_items': cart_items,
-        'form': form,
-        'total': total,
+        'voucher': voucher,
         'voucher_code': voucher_code,
         'discount': discount,
+        'total': total,
+        'slot_times': slot_times,
+        'form': form,
+    }
+
+def allocate_transaction_id(stall):
+    stall_index = get_stall_index(stall.id)
+    transaction_number = TransactionSequence.objects.next_number(stall, localdate())
+    return f"S{stall_index:02d}{transaction_number:03d}"
+
+def place_order(request, checkout, pickup_dt, transaction_id, payment_reference):
+    stall = checkout['stall']
+    with transaction.atomic():
+        reserve_slot(stall, pickup_dt)
+        order = Order.objects.create(
+            user=request.user,
+            stall=stall,
+            pickup_time=pickup_dt,
+            total_cost=checkout['total'],
+            transaction_id=transaction_id,
+            payment_reference=payment_reference,
+            status="Pending",
+            voucher=checkout['voucher']
+        )
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                item=cart_item.item,
+                item_name=cart_item.item.name,
+                unit_price=cart_item.item.price,
+                quantity=cart_item.quantity,
+                line_total=cart_item.subtotal(),
+            )
+            for cart_item in checkout['cart_items']
+        ])
+        checkout['cart'].clear(stall.id)
+        transaction.on_commit(lambda: adjust_queue(stall.id, 1))
+    return order
+
+@login_required
+async def checkout_view(request, stall_id):
+    checkout = await sync_to_async(prepare_checkout)(request, stall_id)
+    if checkout is None:
+        return redirect('view_cart')
+
+    stall = checkout['stall']
+    form = checkout['form']
+    if form.is_bound and form.is_valid():
+        pickup_time_str = form.cleaned_data['pickup_time']
+        if pickup_time_str.startswith("Right Now"):
+            pickup_dt = now() + timedelta(minutes=stall.average_lead_time)
+        else:
+            pickup_dt = checkout['slot_times'][pickup_time_str]
+        transaction_id = await sync_to_async(allocate_transaction_id)(stall)
+        payment_reference = uuid.uuid4().hex
+
+        try:
+            checkout_url = await paymongo.acreate_checkout_session(
+                transaction_id, checkout['total'], f"Order from {stall.name}", payment_reference
+            )
+        except paymongo.PayMongoError:
+            messages.error(request, "Failed to create payment session. Please try again later.")
+            return redirect('view_cart')
+
+        try:
+            await sync_to_async(place_order)(request, checkout, pickup_dt, transaction_id, payment_reference)
+        except SlotFull as e:
+            messages.error(request, f"{e} Please choose another pick-up time.")
+            return redirect('checkout', stall_id=stall.id)
+        return redirect(checkout_url)
+
+    return await sync_to_async(render)(request, 'core/checkout.html', {
+        'stall': stall,
+        'cart_items': checkout['cart_items'],
+        'form': form,
+        'total': checkout['total'],
+        'voucher_code': checkout['voucher_code'],
+        'discount': checkout['discount'],
     })
 
 @login_required
 def mark_order_ready(request, transaction_id):
-    order = Order.objects.get(transaction_id=transaction_id)
+    order = Order.objects.select_related('user', 'stall').get(transaction_id=transaction_id)
     if not request.user.is_staff or order.stall.name[:3].lower() not in request.user.student_id.lower():
         return HttpResponse("Unauthorized", status=403)
-    order.status = "Ready"
-    order.save()
-    messages.success(request, "Order marked as ready!")
-    if order.user.email:
-        send_mail(
-            subject="Your order is ready!",
-            message=f"Hi {order.user.full_name},\n\nYour order {order.transaction_id} from {order.stall.name} is ready for pickup!",
-            from_email="noreply@digitalcafe.com",
-            recipient_list=[order.user.email],
-        )
-    print(f"[SMS] Order {order.transaction_id} ready for pickup! Sent to {order.user.contact_number}")
+    if mark_ready(order):
+        messages.success(request, "Order marked as ready!")
+    else:
+        messages.warning(request, f"Order is already {order.status.lower()}.")
     return redirect('transaction_summary', transaction_id=transaction_id)
 
+KITCHEN_ACTIONS = {"ready": mark_ready, "complete": mark_complete}
+
+def can_manage_stall(user, stall):
+    return user.is_superuser or stall.owner_id == user.id
+
+@login_required
+def kitchen_view(request, stall_id):
+    stall = get_object_or_404(Stall, id=stall_id)
+    if not can_manage_stall(request.user, stall):
+        return HttpResponse("Unauthorized", status=403)
+    try:
+        orders, next_cursor = kitchen_queue(stall.id, request.GET.get('after'))
+    except ValueError:
+        return HttpResponse("Invalid cursor", status=400)
+    return render(request, 'core/kitchen.html', {
+        'stall': stall,
+        'orders': orders,
+        'next_cursor': next_cursor,
+    })
+
+@require_POST
+@login_required
+def kitchen_order_action(request, order_id, action):
+    if action not in KITCHEN_ACTIONS:
+        return JsonResponse({"error": "Unknown action."}, status=400)
+    order = get_object_or_404(Order.objects.select_related('user', 'stall'), id=order_id)
+    if not can_manage_stall(request.user, order.stall):
+        return JsonResponse({"error": "Unauthorized."}, status=403)
+    KITCHEN_ACTIONS[action](order)
+    if order.status == "Cancelled":
+        return JsonResponse({"error": "Order was cancelled."}, status=409)
+    return JsonResponse({"id": order.id, "status": order.status, "is_complete": order.is_complete})
+
+def sse_message(message):
+    return f"data: {json.dumps(message)}\n\n"
+
+@login_required
+async def order_events(request, order_id):
+    user = await request.auser()
+    orders = Order.objects.filter(id=order_id, user=user).values(
+        'id', 'transaction_id', 'status', 'is_paid', 'stall_id'
+    )
+    order = await orders.afirst()
+    if order is None:
+        raise Http404("Transaction not found.")
+
+    async def snapshot():
+        order = await orders.afirst()
+        order['estimated_minutes'] = await sync_to_async(estimated_wait_minutes)(order['stall_id'])
+        return {"type": "order", **order}
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse(await snapshot())
+    # WSGI buffers an async stream to the end and holds the worker meanwhile;
+    # No Content stops the EventSource and the page polls the JSON instead.
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    topics = [pubsub.order_topic(order_id), pubsub.stall_topic(order['stall_id'])]
+
+    async def stream():
+        async with pubsub.get_broker().subscribe(topics, settings.ORDER_EVENTS_KEEPALIVE_SECONDS) as messages:
+            # Snapshot after subscribing so a change in between is not lost.
+            message = await snapshot()
+            yield sse_message(message)
+            if message['status'] in FINAL_ORDER_STATUSES:
+                return
+            async for message in messages:
+                if message is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield sse_message(message)
+                if message.get('status') in FINAL_ORDER_STATUSES:
+                    return
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 def custom_logout_view(request):
     logout(request)
     return render(request, 'core/logout.html')
@@ -299,22 +382,36 @@ def custom_logout_view(request):
 def test_logout_template(request):
     return render(request, 'core/logout.html')
 
-def auto_blacklist_users():
-    unpaid_orders = Order.objects.filter(is_paid=False, status="Pending")
-    for order in unpaid_orders:
-        user = order.user
-        user.blacklisted = True
-        user.save()
-
-@login_required
-def my_orders_view(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'core/my_orders.html', {'orders': orders})
-
 @login_required
 def order_history_view(request):
-    orders = Order.objects.filter(user=request.user).order_by('-created_at')
-    return render(request, 'core/order_history.html', {'orders': orders})
+    sources = [
+        Order.objects.filter(user=request.user).select_related('stall', 'voucher'),
+        ArchivedOrder.objects.filter(user=request.user).select_related('stall', 'voucher'),
+    ]
+    try:
+        orders, next_cursor = keyset_page(
+            sources, 'created_at', request.GET.get('after'), settings.ORDER_HISTORY_PAGE_SIZE, descending=True
+        )
+    except ValueError:
+        return HttpResponse("Invalid cursor", status=400)
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'orders': [
+                {
+                    'transaction_id': order.transaction_id,
+                    'stall': order.stall.name,
+                    'created_at': order.created_at.isoformat(),
+                    'pickup_time': order.pickup_time.isoformat(),
+                    'total_cost': str(order.total_cost),
+                    'status': order.status,
+                    'is_paid': order.is_paid,
+                    'voucher': order.voucher.code if order.voucher else None,
+                }
+                for order in orders
+            ],
+            'next': next_cursor,
+        })
+    return render(request, 'core/order_history.html', {'orders': orders, 'next_cursor': next_cursor})
 
 @csrf_exempt
 def paymongo_webhook(request):
@@ -323,9 +420,8 @@ def paymongo_webhook(request):
 
     payload = request.body
     sig_header = request.headers.get('Paymongo-Signature', '')
-    secret_key = 'your_paymongo_webhook_secret'
     computed_signature = hmac.new(
-        key=bytes(secret_key, 'utf-8'),
+        key=bytes(settings.PAYMONGO_WEBHOOK_SECRET, 'utf-8'),
         msg=payload,
         digestmod=hashlib.sha256
     ).hexdigest()
@@ -333,27 +429,15 @@ def paymongo_webhook(request):
     if not hmac.compare_digest(computed_signature, sig_header):
         return HttpResponse("Invalid signature", status=403)
 
-    data = json.loads(payload)
-    event_type = data["data"]["attributes"]["type"]
-
-    if event_type == "payment.paid":
-        reference = data["data"]["attributes"]["data"]["attributes"]["description"]
-        try:
-            order = Order.objects.get(transaction_id=reference)
-            order.is_paid = True
-            order.save()
-        except Order.DoesNotExist:
-            return HttpResponse("Order not found", status=404)
-
+    try:
+        data = json.loads(payload)
+        event_id = data["data"]["id"]
+        event_type = data["data"]["attributes"]["type"]
+    except (ValueError, KeyError, TypeError):
+        return HttpResponse("Malformed payload", status=400)
+
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(event_id=event_id, event_type=event_type, payload=payload.decode())],
+        ignore_conflicts=True,
+    )
     return JsonResponse({"status": "received"})
-
-def handle_paymongo_webhook(payload):
-    transaction_id = payload["data"]["attributes"]["reference_number"]
-    payment_status = payload["data"]["attributes"]["status"]
-    if payment_status == "paid":
-        try:
-            order = Order.objects.get(transaction_id=transaction_id)
-            order.is_paid = True
-            order.save()
-        except Order.DoesNotExist:
-            pass
@@ -0,0 +1,96 @@
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from datetime import datetime, timedelta, timezone as dt_timezone
+import json
+
+from .models import Order, WebhookEvent
+from .receipts import render_order_receipts
+from . import pubsub
+
+def payment_attributes(payload):
+    return payload["data"]["attributes"]["data"]["attributes"]
+
+def payment_reference(attributes):
+    return (attributes.get("metadata") or {}).get("payment_reference")
+
+def match_orders(payments):
+    """Map each key of ``payments`` to the (id, transaction_id, status) of the order it pays."""
+    references = {key: payment_reference(attributes) for key, attributes in payments.items()}
+    known = {
+        reference: (order_id, transaction_id, status)
+        for reference, order_id, transaction_id, status in Order.objects.filter(
+            payment_reference__in={reference for reference in references.values() if reference}
+        ).values_list('payment_reference', 'id', 'transaction_id', 'status')
+    }
+    matched = {key: known[reference] for key, reference in references.items() if reference in known}
+    for key, attributes in payments.items():
+        # Sessions created before payment_reference existed only carry the
+        # transaction ID, which restarts daily, so pin it to the payment's date.
+        if references[key] is None and attributes.get("description"):
+            created_at = datetime.fromtimestamp(attributes["created_at"], dt_timezone.utc)
+            order = Order.objects.filter(
+                payment_reference__isnull=True, transaction_id=attributes["description"],
+                created_at__date=timezone.localdate(created_at),
+            ).values_list('id', 'transaction_id', 'status').first()
+            if order:
+                matched[key] = order
+    return matched
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+
+def publish_paid(orders):
+    render_order_receipts(id__in=orders)
+    for order_id, (transaction_id, status) in orders.items():
+        pubsub.publish_order(order_id, transaction_id, status, True)
+
+def process_pending_events(batch_size=None):
+    batch_size = batch_size or settings.WEBHOOK_BATCH_SIZE
+    current_time = timezone.now()
+    with transaction.atomic():
+        events = list(
+            WebhookEvent.objects.select_for_update(skip_locked=True)
+            .filter(status="Pending", next_attempt_at__lte=current_time)
+            .order_by('id')[:batch_size]
+        )
+        apply_events(events, current_time)
+    return len(events)
+
+def apply_events(events, current_time):
+    payments = {}
+    failed = {}
+    for event in events:
+        if event.event_type != "payment.paid":
+            continue
+        try:
+            attributes = payment_attributes(json.loads(event.payload))
+            attributes.setdefault("created_at", int(event.received_at.timestamp()))
+            payments[event.id] = attributes
+        except (ValueError, KeyError, TypeError, AttributeError) as exc:
+            failed[event.id] = f"Malformed payload: {exc!r}"
+
+    matched = match_orders(payments)
+    for event_id, attributes in payments.items():
+        if event_id not in matched:
+            failed[event_id] = f"Order {payment_reference(attributes) or attributes.get('description')} not found"
+
+    paid = {order[0]: order[1:] for order in matched.values()}
+    Order.objects.filter(id__in=paid, is_paid=False).update(is_paid=True, updated_at=current_time)
+    transaction.on_commit(lambda: publish_paid(paid))
+
+    for event in events:
+        event.attempts += 1
+        if event.id not in failed:
+            event.status = "Processed"
+            event.processed_at = current_time
+            event.last_error = ""
+        else:
+            event.last_error = failed[event.id]
+            if event.attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                event.status = "Dead"
+            else:
+                event.next_attempt_at = current_time + retry_delay(event.attempts)
+    WebhookEvent.objects.bulk_update(
+        events, ['attempts', 'status', 'processed_at', 'last_error', 'next_attempt_at']
+    )
@@ -2,6 +2,8 @@
 ASGI config for jsecexpress project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve through it (e.g. ``uvicorn jsecexpress.asgi:application``) so the
+order status event streams stay open without tying up a worker thread each.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -12,5 +14,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "jsecexpress.settings")
+os.environ.setdefault("PAYMONGO_ASYNC_CLIENT", "True")
 
 application = get_asgi_application()
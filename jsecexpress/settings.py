@@ -30,6 +30,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.middleware.BlacklistMiddleware",
 ]
 
 ROOT_URLCONF = "jsecexpress.urls"
@@ -45,6 +46,7 @@ TEMPLATES = [
                 "django.template.context_processors.request",
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
+                "core.context_processors.cart_count",
             ],
         },
     },
@@ -56,9 +58,40 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # SQLite ignores select_for_update; taking the write lock at BEGIN makes
+        # concurrent transactions queue (up to "timeout" seconds) instead of
+        # failing with "database is locked" when a reader tries to write.
+        "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 20},
     }
 }
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "jsecexpress"),
+    }
+}
+# Invalidation and counters only reach other processes (web workers,
+# management commands) through a shared backend such as Redis or Memcached;
+# `manage.py check --deploy` warns when the cache is per process.
+CACHE_IS_SHARED = CACHES["default"]["BACKEND"] not in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+MENU_CACHE_TIMEOUT = int(os.getenv("MENU_CACHE_TIMEOUT", 60 * 60 * 24))
+# A per-process cache never sees another worker's version bump, so let the
+# version expire and the snapshot be rebuilt at least this often.
+MENU_VERSION_TIMEOUT = None if CACHE_IS_SHARED else int(os.getenv("MENU_VERSION_TIMEOUT", 60))
+HOME_PENDING_ORDERS_LIMIT = 20
+# Likewise each worker adjusts only its own queue counters and the reconcile
+# command corrects only its own, so recount from the DB this often.
+QUEUE_DEPTH_TIMEOUT = None if CACHE_IS_SHARED else int(os.getenv("QUEUE_DEPTH_TIMEOUT", 60))
+
+CART_BACKEND = os.getenv("CART_BACKEND", "core.cart.DatabaseCart")
+CART_CACHE_TIMEOUT = int(os.getenv("CART_CACHE_TIMEOUT", 60 * 10))
+CART_COUNT_TIMEOUT = int(os.getenv("CART_COUNT_TIMEOUT", 60 * 60))
+
 LANGUAGE_CODE = "en-us"
 TIME_ZONE = "Asia/Manila"
 USE_I18N = True
@@ -73,6 +106,62 @@ LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/login/"
 
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+NOTIFICATION_FROM_EMAIL = "noreply@digitalcafe.com"
+SMS_GATEWAY = os.getenv("SMS_GATEWAY", "core.notifications.ConsoleSMSGateway")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {"core": {"handlers": ["console"], "level": os.getenv("CORE_LOG_LEVEL", "INFO")}},
+}
+NOTIFICATION_BATCH_SIZE = 100
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_BASE_SECONDS = 30
+NOTIFICATION_LEASE_SECONDS = 300
+
+# InProcessBroker only reaches streams in the publishing process, so
+# CacheBroker is the default whenever the cache is shared with the other
+# workers and process_webhooks.
+PUBSUB_BACKEND = os.getenv(
+    "PUBSUB_BACKEND", "core.pubsub.CacheBroker" if CACHE_IS_SHARED else "core.pubsub.InProcessBroker"
+)
+PUBSUB_POLL_SECONDS = 1
+PUBSUB_MESSAGE_TIMEOUT = 60 * 60
+ORDER_EVENTS_KEEPALIVE_SECONDS = 15
+
+KITCHEN_PAGE_SIZE = 50
+ORDER_HISTORY_PAGE_SIZE = 20
+
+ORDER_ARCHIVE_AFTER_DAYS = 180
+ORDER_ARCHIVE_CHUNK_SIZE = 500
+
+RECEIPT_ROOT = os.getenv("RECEIPT_ROOT", BASE_DIR / "receipts")
+RECEIPT_RENDER_CHUNK_SIZE = 200
+# Worker processes each web process keeps for rendering receipts missing from a ZIP download.
+RECEIPT_RENDER_WORKERS = int(os.getenv("RECEIPT_RENDER_WORKERS", 2))
+RECEIPT_STALE_SECONDS = 60 * 60
+
+EXPORT_CHUNK_SIZE = 2000
+PARQUET_EXPORT_ROOT = os.getenv("PARQUET_EXPORT_ROOT", BASE_DIR / "exports" / "parquet")
+PARQUET_EXPORT_OVERLAP_SECONDS = 5 * 60
 
 PAYMONGO_SECRET_KEY = os.getenv("PAYMONGO_SECRET_KEY", "")
 PAYMONGO_PUBLIC_KEY = os.getenv("PAYMONGO_PUBLIC_KEY", "")
+PAYMONGO_API_BASE = os.getenv("PAYMONGO_API_BASE", "https://api.paymongo.com/v1")
+PAYMONGO_CONNECT_TIMEOUT = 3.05
+PAYMONGO_READ_TIMEOUT = 10
+PAYMONGO_MAX_RETRIES = 2
+PAYMONGO_RETRY_BACKOFF = 0.3
+PAYMONGO_POOL_SIZE = 10
+# Use the httpx client from async views; jsecexpress.asgi turns this on.
+PAYMONGO_ASYNC_CLIENT = os.getenv("PAYMONGO_ASYNC_CLIENT", "False") == "True"
+PAYMONGO_BREAKER_THRESHOLD = 5
+PAYMONGO_BREAKER_RESET_SECONDS = 30
+PAYMONGO_WEBHOOK_SECRET = os.getenv("PAYMONGO_WEBHOOK_SECRET", "your_paymongo_webhook_secret")
+
+WEBHOOK_BATCH_SIZE = 100
+WEBHOOK_MAX_ATTEMPTS = 8
+WEBHOOK_RETRY_BASE_SECONDS = 30
+
+BLACKLIST_UNPAID_GRACE_MINUTES = 30